@@ -1,8 +1,11 @@
 import telebot
 import config
+from dispatcher import DispatchingTeleBot
 from handlers import client_handlers, admin_handlers
 import reminders
+import webhook
 import data # Импортируем data
+import migrations
 
 # Получаем токен и список админов из конфига
 BOT_TOKEN = config.BOT_TOKEN
@@ -11,8 +14,8 @@ ADMIN_IDS = config.ADMIN_IDS
 if not BOT_TOKEN:
     raise ValueError("Не найден токен бота. Проверь файл .env")
 
-# Создаем бота
-bot = telebot.TeleBot(BOT_TOKEN)
+# Создаем бота: обновления разных чатов обрабатываются параллельно, одного чата — по порядку
+bot = DispatchingTeleBot(BOT_TOKEN, num_workers=config.DISPATCH_WORKERS)
 
 # Настраиваем команды меню
 def setup_bot_commands():
@@ -22,6 +25,7 @@ def setup_bot_commands():
         telebot.types.BotCommand("/help", "Помощь"),
         telebot.types.BotCommand("/admin", "Админ панель"),
         telebot.types.BotCommand("/admin_help", "Помощь администратора"),
+        telebot.types.BotCommand("/db_stats", "Статистика БД (для администратора)"),
     ]
     try:
         bot.set_my_commands(commands)
@@ -36,8 +40,11 @@ admin_handlers.register_admin_handlers(bot, ADMIN_IDS)
 
 # Запуск бота
 if __name__ == '__main__':
-    print("Инициализация базы данных...")
-    data.init_db() # Вызываем инициализацию БД
+    print("Проверка схемы базы данных...")
+    migrations.ensure_schema() # Обычно один запрос версии; миграции — только если схема отстаёт
+    reminders.responses.replay_journal() # Ответы на напоминания, не записанные при прошлой остановке
+    if data.start_cache_listener():
+        print("Кэши синхронизируются с другими процессами бота (LISTEN/NOTIFY)")
 
     print("Бот запущен...")
     print(f"Администраторские ID: {ADMIN_IDS}")
@@ -53,10 +60,33 @@ if __name__ == '__main__':
     else:
         print("Напоминания отключены (dev режим)")
 
-    # Запускаем polling с обработкой исключений
+    # Запускаем приём обновлений (webhook или polling) с обработкой исключений
     try:
-        bot.polling(none_stop=True)
+        if config.BOT_MODE == 'webhook':
+            webhook.run(
+                bot,
+                url=config.WEBHOOK_URL,
+                path=config.WEBHOOK_PATH,
+                secret_token=config.WEBHOOK_SECRET,
+                host=config.WEBHOOK_LISTEN_HOST,
+                port=config.WEBHOOK_LISTEN_PORT,
+            )
+        else:
+            # Оставшийся от webhook-режима webhook не даст получать обновления polling'ом
+            bot.delete_webhook()
+            bot.polling(none_stop=True)
     except KeyboardInterrupt:
         print("\nБот остановлен пользователем.")
     except Exception as e:
         print(f"Ошибка при запуске бота: {e}")
+    finally:
+        bot.dispatcher.stop() # Дорабатываем уже полученные обновления
+        print(f"Статистика обработки обновлений: {bot.dispatcher.stats()}")
+        reminders.responses.close() # Дописываем накопленные ответы на напоминания до закрытия пула
+        data.stop_cache_listener()
+        print(f"Статистика очереди ответов на напоминания: {reminders.responses.stats()}")
+        print(f"Статистика пула соединений: {data.get_pool_stats()}")
+        if config.DATABASE_READ_URL:
+            print(f"Статистика реплики: {data.get_replica_stats()}")
+        print(f"Статистика кэша слотов: {data.get_cache_stats()}")
+        data.close_pool()
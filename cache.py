@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class VersionedCache:
+    """Потокобезопасный read-through кэш с версией, TTL и ограничением размера.
+
+    Каждая запись помнит версию данных, при которой была загружена. Любая запись
+    в источник вызывает bump_version(), после чего все прежние записи считаются
+    устаревшими. Дополнительно записи живут не дольше ttl секунд, а при превышении
+    max_entries вытесняются самые давно использованные.
+    """
+
+    def __init__(self, name, ttl=30.0, max_entries=64):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (версия, время истечения, значение)
+        self._version = 0
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    @property
+    def version(self):
+        return self._version
+
+    def get(self, key, loader):
+        """Возвращает значение из кэша или загружает его через loader()."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                version, expires_at, value = entry
+                if version == self._version and expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return value
+                del self._entries[key]
+            self._stats['misses'] += 1
+            # Запоминаем версию до загрузки: если во время загрузки данные изменятся,
+            # запись сразу окажется устаревшей и не будет отдана повторно
+            version = self._version
+
+        value = loader()
+
+        with self._lock:
+            if version == self._version and self.max_entries > 0:
+                self._entries[key] = (version, time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._stats['evictions'] += 1
+        return value
+
+    def bump_version(self):
+        """Отмечает, что данные в источнике изменились."""
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            self._stats['invalidations'] += 1
+
+    def stats(self):
+        """Снимок счётчиков попаданий/промахов."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['version'] = self._version
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
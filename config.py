@@ -29,6 +29,43 @@ if not DATABASE_URL:
     DATABASE_URL = 'sqlite:///bot_database.db' # Значение по умолчанию для локальной разработки
 # ------------------------------------------------
 
+# Необязательная реплика для чтения: списки администратора, аналитика и история ДЗ
+# читаются с неё, пока её отставание не больше DB_REPLICA_MAX_LAG секунд
+DATABASE_READ_URL = get_env_var('DATABASE_READ_URL') or None
+DB_REPLICA_MAX_LAG = float(get_env_var('DB_REPLICA_MAX_LAG', '5'))  # сек
+
+# Настройки пула соединений с БД
+DB_POOL_MIN_SIZE = int(get_env_var('DB_POOL_MIN_SIZE', '1'))
+DB_POOL_MAX_SIZE = int(get_env_var('DB_POOL_MAX_SIZE', '10'))
+DB_POOL_TIMEOUT = float(get_env_var('DB_POOL_TIMEOUT', '30'))  # сколько ждать свободное соединение, сек
+DB_POOL_HEALTH_CHECK_INTERVAL = float(get_env_var('DB_POOL_HEALTH_CHECK_INTERVAL', '60'))  # проверять простаивающие соединения старше, сек
+
+# Кэш каталога слотов в памяти процесса
+SLOTS_CACHE_TTL = float(get_env_var('SLOTS_CACHE_TTL', '30'))  # сек
+SLOTS_CACHE_MAX_ENTRIES = int(get_env_var('SLOTS_CACHE_MAX_ENTRIES', '64'))
+
+# Сброс кэшей в других процессах бота через LISTEN/NOTIFY (только PostgreSQL)
+CACHE_SYNC_ENABLED = get_env_var('CACHE_SYNC_ENABLED', 'true').lower() in ('true', '1', 'on', 'yes')
+
+# Замеры времени функций data.py: вызовы дольше порога пишутся в лог (аргументы маскируются)
+DB_SLOW_QUERY_MS = float(get_env_var('DB_SLOW_QUERY_MS', '500'))
+
+# Серверные подготовленные запросы (PREPARE/EXECUTE) для частых запросов.
+# Отключите, если соединения идут через pgbouncer в режиме transaction pooling
+DB_PREPARED_STATEMENTS = get_env_var('DB_PREPARED_STATEMENTS', 'true').lower() in ('true', '1', 'on', 'yes')
+
+# Горизонт записи: клиенту и в админских списках слотов показываются даты [сегодня, сегодня + N дней)
+SLOTS_HORIZON_DAYS = int(get_env_var('SLOTS_HORIZON_DAYS', '60'))
+
+# Ответы на напоминания пишутся в БД пачками (write-behind)
+REMINDER_FLUSH_INTERVAL = float(get_env_var('REMINDER_FLUSH_INTERVAL', '1'))  # сек
+REMINDER_FLUSH_BATCH = int(get_env_var('REMINDER_FLUSH_BATCH', '200'))  # ответов в одной пачке
+REMINDER_JOURNAL_PATH = get_env_var('REMINDER_JOURNAL_PATH', 'reminder_responses.journal')  # если БД недоступна при остановке
+
+# Архив прошедших занятий: слоты и записи старше горизонта переносятся в *_archive
+ARCHIVE_AFTER_DAYS = int(get_env_var('ARCHIVE_AFTER_DAYS', '30'))  # дней после занятия
+ARCHIVE_BATCH_SIZE = int(get_env_var('ARCHIVE_BATCH_SIZE', '500'))  # строк за одну транзакцию
+
 # Конфигурация бота
 BOT_TOKEN = get_env_var('BOT_TOKEN', required=True)
 DEV_ADMIN_IDS = parse_admin_ids('ADMIN_ID', 'SECONDARY_ADMIN_ID')
@@ -37,6 +74,23 @@ DEV_ADMIN_IDS = parse_admin_ids('ADMIN_ID', 'SECONDARY_ADMIN_ID')
 PROD_BOT_TOKEN = get_env_var('PROD_BOT_TOKEN')
 PROD_ADMIN_IDS = parse_admin_ids('PROD_ADMIN_ID', 'PROD_SECONDARY_ADMIN_ID')
 
+# Потоки обработки обновлений: разные чаты обрабатываются параллельно, один чат — по порядку.
+# Каждый поток может держать соединение с БД, поэтому держите значение не больше DB_POOL_MAX_SIZE
+DISPATCH_WORKERS = int(get_env_var('DISPATCH_WORKERS', '8'))
+
+# Режим получения обновлений: polling (long polling) или webhook (встроенный HTTP-сервер)
+BOT_MODE = get_env_var('BOT_MODE', 'polling').lower()
+WEBHOOK_URL = get_env_var('WEBHOOK_URL')  # публичный https-адрес, например https://bot.example.com
+WEBHOOK_PATH = get_env_var('WEBHOOK_PATH', '/telegram/webhook')
+WEBHOOK_SECRET = get_env_var('WEBHOOK_SECRET')  # сверяется с заголовком X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_LISTEN_HOST = get_env_var('WEBHOOK_LISTEN_HOST', '0.0.0.0')
+WEBHOOK_LISTEN_PORT = int(get_env_var('WEBHOOK_LISTEN_PORT', '8080'))
+
+if BOT_MODE not in ('polling', 'webhook'):
+    raise EnvironmentError(f"BOT_MODE должен быть polling или webhook, а не {BOT_MODE!r}.")
+if BOT_MODE == 'webhook' and not (WEBHOOK_URL and WEBHOOK_SECRET):
+    raise EnvironmentError("Для BOT_MODE=webhook нужны WEBHOOK_URL и WEBHOOK_SECRET.")
+
 # Флаг для определения окружения
 IS_PRODUCTION = os.getenv('IS_PRODUCTION', '').lower() in ('true', '1', 'on', 'yes')
 
@@ -1,250 +1,686 @@
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import base64
+import functools
+import threading
+import time
+import uuid
+from contextlib import contextmanager
 import config
-from datetime import datetime
+from datetime import datetime, timedelta
+from db_backends import create_backend
+from cache import VersionedCache
+from query_stats import QueryStats
+from records import Slot, Booking, UserBooking, BookingOverview, Homework, UserHomework
 
 # Используем строку подключения из config.py
 DATABASE_URL = config.DATABASE_URL
 
-def get_db_connection():
-    """Создает и возвращает соединение с PostgreSQL."""
-    conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
-    return conn
+# Хранилище (PostgreSQL или SQLite, см. db_backends.py) с общим пулом соединений
+# для обработчиков и потока напоминаний (создаётся лениво)
+_backend = None
+_backend_lock = threading.Lock()
 
-def init_db():
-    """Создает таблицы в PostgreSQL, если они не существуют."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def get_backend():
+    """Возвращает бэкенд хранилища, выбранный по DATABASE_URL, создавая его при первом обращении."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend(
+                    DATABASE_URL,
+                    min_size=config.DB_POOL_MIN_SIZE,
+                    max_size=config.DB_POOL_MAX_SIZE,
+                    timeout=config.DB_POOL_TIMEOUT,
+                    health_check_interval=config.DB_POOL_HEALTH_CHECK_INTERVAL,
+                    prepare_statements=config.DB_PREPARED_STATEMENTS,
+                )
+    return _backend
 
-    # Таблица пользователей (остаётся без изменений)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            user_id BIGINT PRIMARY KEY,
-            parent_name TEXT NOT NULL,
-            phone TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+def execute_prepared(cursor, name, query, params=None):
+    """Выполняет частый запрос как подготовленный (см. backend.execute_prepared)."""
+    get_backend().execute_prepared(cursor, name, query, params)
 
-    # Таблица слотов (остаётся без изменений)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS slots (
-            id SERIAL PRIMARY KEY,
-            date TEXT NOT NULL, -- в формате 'DD.MM.YYYY'
-            time TEXT NOT NULL, -- в формате 'HH:MM-HH:MM'
-            available BOOLEAN DEFAULT TRUE,
-            deleted_by_admin BOOLEAN DEFAULT FALSE
-        )
-    ''')
+@contextmanager
+def db_connection():
+    """Выдаёт соединение из пула и возвращает его обратно после использования."""
+    started = time.perf_counter()
+    with get_backend().connection() as conn:
+        _query_stats.add_wait(time.perf_counter() - started)
+        yield conn
 
-    # Уникальный индекс (остаётся без изменений)
-    cursor.execute('''
-        CREATE UNIQUE INDEX IF NOT EXISTS idx_slots_date_time ON slots (date, time);
-    ''')
+def get_pool_stats():
+    """Статистика использования пула соединений (пустой dict, если пул ещё не создан)."""
+    return _backend.stats() if _backend is not None else {}
 
-    # Таблица записей (ИЗМЕНЕНО: добавлен parent_name)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS bookings (
-            id SERIAL PRIMARY KEY,
-            user_id BIGINT NOT NULL,
-            date TEXT NOT NULL, -- в формате 'DD.MM.YYYY'
-            time TEXT NOT NULL, -- в формате 'HH:MM-HH:MM'
-            child_name TEXT NOT NULL,
-            phone TEXT,
-            parent_name TEXT, -- <-- НОВОЕ ПОЛЕ
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            confirmed BOOLEAN DEFAULT FALSE,
-            cancelled_by_user BOOLEAN DEFAULT FALSE,
-            cancelled_by_admin BOOLEAN DEFAULT FALSE,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
+def close_pool():
+    """Закрывает все соединения пула (при остановке бота)."""
+    global _backend, _read_backend
+    with _backend_lock:
+        if _backend is not None:
+            _backend.close()
+            _backend = None
+    _stop_replica_monitor()
+    with _replica_lock:
+        if _read_backend is not None:
+            _read_backend.close()
+            _read_backend = None
+
+# --- Замеры времени ---
+
+# Все публичные функции этого модуля (кроме _UNTIMED) в конце модуля оборачиваются
+# замером времени: число вызовов, гистограмма задержек, возвращённые строки и ожидание
+# соединения из пула. Медленные вызовы (config.DB_SLOW_QUERY_MS) пишутся в лог.
+
+_query_stats = QueryStats(slow_threshold_ms=config.DB_SLOW_QUERY_MS)
+
+# Служебные функции без обращения к БД или вызываемые внутри замеряемых
+_UNTIMED = {
+    'get_backend', 'get_read_backend', 'execute_prepared', 'db_connection', 'db_read_connection',
+    'get_pool_stats', 'get_cache_stats', 'get_replica_stats', 'get_query_stats', 'reset_query_stats',
+    'close_pool', 'parse_slot_datetime', 'slots_horizon', 'archive_horizon',
+    'start_cache_listener', 'stop_cache_listener',
+}
+
+def get_query_stats():
+    """Замеры по функциям data.py (list из dict), от самых затратных по суммарному времени.
+
+    Ключи: name, calls, errors, slow, total_ms, avg_ms, p95_ms, max_ms, avg_rows,
+    avg_wait_ms, histogram (число вызовов по корзинам QueryStats.BUCKETS_MS и последняя — больше).
+    """
+    return _query_stats.snapshot()
+
+def reset_query_stats():
+    _query_stats.reset()
+
+def _instrument():
+    for name, func in list(globals().items()):
+        if name.startswith('_') or name in _UNTIMED:
+            continue
+        if callable(func) and getattr(func, '__module__', None) == __name__ and not isinstance(func, type):
+            globals()[name] = _query_stats.timed(func)
+
+# --- Чтение с реплики ---
+
+# Если задан DATABASE_READ_URL, тяжёлые чтения — списки администратора, аналитика,
+# история ДЗ, потоковый перебор всех записей — идут через db_read_connection() на
+# реплику, пока её отставание не больше DB_REPLICA_MAX_LAG секунд, иначе на основную БД.
+# Чтения, которые должны видеть только что сделанные изменения (записи клиента, слоты
+# при записи, запись перед отправкой ДЗ, напоминания), всегда идут через db_connection().
+
+REPLICA_LAG_CHECK_INTERVAL = 1.0  # сек; пауза между проверками отставания
+REPLICA_PROBE_TIMEOUT = 2  # сек; таймаут подключения при проверке (без повторов)
+
+_read_backend = None
+_replica_lock = threading.Lock()
+_replica_state = {'checked_at': None, 'lag': None, 'usable': False}
+_replica_monitor = {'thread': None, 'stop': None}
+
+def get_read_backend():
+    """Бэкенд реплики по DATABASE_READ_URL (None, если реплика не настроена)."""
+    global _read_backend
+    if config.DATABASE_READ_URL is None:
+        return None
+    if _read_backend is None:
+        with _replica_lock:
+            if _read_backend is None:
+                # Соединения с репликой открываются только под чтения: её доступность
+                # проверяет _monitor_replica, а не создание пула
+                _read_backend = create_backend(
+                    config.DATABASE_READ_URL,
+                    min_size=0,
+                    max_size=config.DB_POOL_MAX_SIZE,
+                    timeout=config.DB_POOL_TIMEOUT,
+                    health_check_interval=config.DB_POOL_HEALTH_CHECK_INTERVAL,
+                    prepare_statements=config.DB_PREPARED_STATEMENTS,
+                )
+    return _read_backend
+
+def _monitor_replica(stop):
+    """Фоновый поток: раз в REPLICA_LAG_CHECK_INTERVAL обновляет отставание реплики.
+
+    Проверка идёт на отдельном соединении с коротким таймаутом, так что недоступная
+    реплика не задерживает обработчики: они только читают последнее решение.
+    """
+    was_usable = False
+    first_check = True
+    while True:
+        try:
+            lag = get_read_backend().probe_replication_lag(REPLICA_PROBE_TIMEOUT)
+        except Exception as e:
+            if was_usable or first_check:
+                print(f"Реплика недоступна, чтение идёт с основной БД: {e}")
+            lag = None
+        usable = lag is not None and lag <= config.DB_REPLICA_MAX_LAG
+        if usable != was_usable and lag is not None:
+            print(f"Реплика {'используется' if usable else 'отстаёт, чтение идёт с основной БД'} (отставание {lag:.1f} с)")
+
+        with _replica_lock:
+            _replica_state.update(checked_at=time.monotonic(), lag=lag, usable=usable)
+        was_usable = usable
+        first_check = False
+        if stop.wait(REPLICA_LAG_CHECK_INTERVAL):
+            return
+
+def _start_replica_monitor():
+    with _replica_lock:
+        if _replica_monitor['thread'] is not None:
+            return
+        stop = threading.Event()
+        thread = threading.Thread(target=_monitor_replica, args=(stop,), name='replica-monitor', daemon=True)
+        _replica_monitor.update(thread=thread, stop=stop)
+    thread.start()
+
+def _stop_replica_monitor():
+    with _replica_lock:
+        thread, stop = _replica_monitor['thread'], _replica_monitor['stop']
+        _replica_monitor.update(thread=None, stop=None)
+        _replica_state.update(checked_at=None, lag=None, usable=False)
+    if thread is not None:
+        stop.set()
+        thread.join(timeout=10)
+
+def _replica_usable():
+    """Можно ли читать с реплики: она доступна и отстаёт не больше DB_REPLICA_MAX_LAG.
+
+    Решение принимает фоновый поток; до его первой проверки чтение идёт с основной БД.
+    """
+    if _replica_monitor['thread'] is None:
+        _start_replica_monitor()
+    return _replica_state['usable']
+
+def _read_target():
+    """Бэкенд для чтения, допускающего отставание: реплика, если она настроена и свежая."""
+    if config.DATABASE_READ_URL is not None and _replica_usable():
+        read_backend = _read_backend
+        if read_backend is not None:
+            return read_backend
+    return get_backend()
+
+@contextmanager
+def db_read_connection():
+    """Соединение для чтения, которому не нужны только что сделанные изменения (см. выше)."""
+    backend = _read_target()
+    started = time.perf_counter()
+    with backend.connection() as conn:
+        _query_stats.add_wait(time.perf_counter() - started)
+        yield conn
+
+def get_replica_stats():
+    """Состояние реплики: отставание, используется ли она и статистика её пула."""
+    if _read_backend is None:
+        return {}
+    with _replica_lock:
+        state = dict(_replica_state)
+    return {'lag': state['lag'], 'usable': state['usable'], 'pool': _read_backend.stats()}
+
+# --- Типы записей ---
+
+# Строки читаются обычным (кортежным) курсором и сразу превращаются в компактные
+# неизменяемые записи из records.py. Порядок столбцов в SELECT задаётся полями записи.
+
+def _columns(record_cls, alias=None):
+    """Список столбцов для SELECT/RETURNING в порядке полей записи."""
+    prefix = f"{alias}." if alias else ''
+    return ', '.join(prefix + field for field in record_cls._fields)
+
+SLOT_COLUMNS = _columns(Slot)
+BOOKING_COLUMNS = _columns(Booking)
+HOMEWORK_COLUMNS = _columns(Homework)
+
+# --- Кэш каталога слотов ---
+
+# Каталог слотов читается почти на каждом нажатии кнопки, а меняется редко.
+# Любая функция, изменяющая слоты, помечена @_invalidates_slots и увеличивает версию кэша.
+_slots_cache = VersionedCache('slots', ttl=config.SLOTS_CACHE_TTL, max_entries=config.SLOTS_CACHE_MAX_ENTRIES)
+
+# Кэши процесса по виду данных; функции записи помечены @_invalidates(вид, ...)
+_local_caches = {
+    'slots': _slots_cache,
+}
+
+# Другие процессы бота узнают об изменениях через NOTIFY на CACHE_CHANNEL, который
+# функция записи отправляет в своей транзакции (_notify_changes): PostgreSQL доставляет
+# его только после коммита. Получатели сбрасывают кэши того же вида — см. start_cache_listener().
+CACHE_CHANNEL = 'bot_cache_invalidation'
+_instance_id = uuid.uuid4().hex[:12]
+_cache_listener = {'thread': None, 'stop': None}
+
+def _invalidates(*kinds):
+    """Декоратор функции записи: после неё сбрасывает кэши kinds этого процесса."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                for kind in kinds:
+                    if kind in _local_caches:
+                        _local_caches[kind].bump_version()
+        return wrapper
+    return decorator
+
+_invalidates_slots = _invalidates('slots')
+
+def _notify_changes(cursor, *kinds):
+    """Сообщает другим процессам об изменении kinds в транзакции cursor (перед commit).
+
+    Уведомление уходит вместе с коммитом и пропадает при откате: отдельное соединение
+    не нужно, а записанное изменение не может остаться без уведомления.
+    """
+    backend = get_backend()
+    if config.CACHE_SYNC_ENABLED and backend.supports_notify:
+        backend.notify(cursor, CACHE_CHANNEL, f"{_instance_id}:{','.join(kinds)}")
+
+def _handle_invalidation(payload):
+    if payload is None:
+        # (Пере)подключение: пропущенные уведомления неизвестны — сбрасываем всё
+        for cache in _local_caches.values():
+            cache.bump_version()
+        return
+    sender, _, kinds = payload.partition(':')
+    if sender == _instance_id:
+        return
+    for kind in kinds.split(','):
+        if kind in _local_caches:
+            _local_caches[kind].bump_version()
+
+def start_cache_listener():
+    """Запускает поток, сбрасывающий кэши по изменениям из других процессов бота.
+
+    Возвращает False, если синхронизация отключена или бэкенд её не поддерживает (SQLite).
+    """
+    backend = get_backend()
+    if not config.CACHE_SYNC_ENABLED or not backend.supports_notify:
+        return False
+    if _cache_listener['thread'] is None:
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=backend.listen, args=(CACHE_CHANNEL, _handle_invalidation, stop),
+            name='cache-listener', daemon=True,
         )
-    ''')
+        _cache_listener.update(thread=thread, stop=stop)
+        thread.start()
+    return True
+
+def stop_cache_listener():
+    if _cache_listener['thread'] is not None:
+        _cache_listener['stop'].set()
+        _cache_listener['thread'].join(timeout=10)
+        _cache_listener.update(thread=None, stop=None)
 
-    # Добавляем столбец, если его нет (на случай, если таблица уже существует)
+def get_cache_stats():
+    """Статистика кэша слотов (попадания, промахи, текущая версия)."""
+    return _slots_cache.stats()
+
+# --- Типизированные дата и время занятия ---
+
+# Строки слотов/записей хранят дату и время в двух видах: текстовые date ('DD.MM.YYYY')
+# и time ('HH:MM-HH:MM') для отображения и callback_data, а также типизированные
+# lesson_date, start_time, end_time и starts_at (начало занятия) для фильтров,
+# сортировки и индексов. Типизированные значения вычисляются один раз при записи.
+
+BACKFILL_BATCH_SIZE = 500
+
+TYPED_DATETIME_COLUMNS = [
+    ('lesson_date', 'DATE'),
+    ('start_time', 'TIME'),
+    ('end_time', 'TIME'),
+    ('starts_at', 'TIMESTAMP'),
+]
+
+def parse_slot_datetime(date_str, time_str):
+    """Разбирает 'DD.MM.YYYY' и 'HH:MM-HH:MM' в (lesson_date, start_time, end_time, starts_at)."""
+    lesson_date = datetime.strptime(date_str.strip(), "%d.%m.%Y").date()
+    start_str, _, end_str = time_str.partition('-')
+    start_time = datetime.strptime(start_str.strip(), "%H:%M").time()
+    end_time = datetime.strptime(end_str.strip(), "%H:%M").time() if end_str.strip() else None
+    return lesson_date, start_time, end_time, datetime.combine(lesson_date, start_time)
+
+def _typed_columns(date_str, time_str):
+    """Как parse_slot_datetime, но для некорректных строк возвращает NULL-значения."""
     try:
-        cursor.execute('ALTER TABLE bookings ADD COLUMN parent_name TEXT;')
-    except psycopg2.errors.DuplicateColumn:
-        pass # Столбец уже существует, всё ок
-    conn.commit()
+        return parse_slot_datetime(date_str, time_str)
+    except (ValueError, AttributeError):
+        print(f"Некорректные дата/время: {date_str!r} {time_str!r}")
+        return None, None, None, None
 
-    # Таблица домашних заданий (остаётся без изменений)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS homeworks (
-            id SERIAL PRIMARY KEY,
-            booking_id INTEGER NOT NULL,
-            file_id TEXT NOT NULL,
-            file_type TEXT NOT NULL,
-            comment TEXT,
-            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            sent_by_admin_id BIGINT,
-            FOREIGN KEY (booking_id) REFERENCES bookings (id)
-        )
-    ''')
+@_invalidates_slots
+def migrate_typed_datetime_columns(batch_size=BACKFILL_BATCH_SIZE):
+    """Онлайн-миграция: добавляет типизированные столбцы и заполняет их пачками.
 
-    conn.commit()
-    conn.close()
-    print("База данных PostgreSQL инициализирована.")
+    Каждая пачка коммитится отдельно, поэтому блокировки строк короткие и бот может
+    работать во время миграции. Индексы затем строит create_indexes().
+    Вызывается из migrations.py.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        for table in ('slots', 'bookings'):
+            get_backend().add_columns(cursor, table, TYPED_DATETIME_COLUMNS)
+        conn.commit()
 
-# --- Функции для работы с пользователями ---
+        for table in ('slots', 'bookings'):
+            last_id = 0
+            migrated = 0
+            while True:
+                # Keyset по id: строки с нераспознаваемой датой не зациклят миграцию
+                cursor.execute(f'''
+                    SELECT id, date, time FROM {table}
+                    WHERE starts_at IS NULL AND id > %s
+                    ORDER BY id
+                    LIMIT %s
+                ''', (last_id, batch_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+
+                values = []
+                for row_id, date_str, time_str in rows:
+                    typed = _typed_columns(date_str, time_str)
+                    if typed[0] is not None:
+                        values.append((row_id,) + typed)
+                if values:
+                    get_backend().bulk_update(cursor, table, TYPED_DATETIME_COLUMNS, values)
+                    _notify_changes(cursor, 'slots')
+                conn.commit()
+                migrated += len(values)
+            if migrated:
+                print(f"Миграция {table}: заполнено {migrated} строк с типизированной датой")
 
-def load_users():
-    """Загружает всех пользователей из БД."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT user_id, parent_name, phone, created_at FROM users')
-    rows = cursor.fetchall()
-    conn.close()
+def create_indexes(indexes, unique=False):
+    """Создаёт недостающие индексы [(имя, определение)], не блокируя запись в таблицы
+    (в PostgreSQL — CREATE INDEX CONCURRENTLY)."""
+    with db_connection() as conn:
+        get_backend().create_indexes(conn, indexes, unique=unique)
 
+# --- Сводные таблицы аналитики ---
+
+# Счётчики обновляются в той же транзакции, что и изменение записи, поэтому экран
+# аналитики читает только их и не сканирует историю bookings. Записи без timestamp
+# относятся к дню ROLLUP_UNKNOWN_DAY: они учитываются в итогах, но не в периодах.
+
+ROLLUP_UNKNOWN_DAY = datetime(1970, 1, 1).date()
+
+def _rollup_day(timestamp):
+    return timestamp.date() if timestamp is not None else ROLLUP_UNKNOWN_DAY
+
+def _apply_rollup_delta(cursor, old=None, new=None):
+    """Переносит в сводные таблицы переход записи из состояния old в new.
+
+    old/new — Booking (или None для вставки/удаления). Вклад old вычитается,
+    вклад new прибавляется; нулевые изменения в БД не пишутся.
+    """
+    _apply_rollup_deltas(cursor, [(old, new)])
+
+def _apply_rollup_deltas(cursor, changes):
+    """Как _apply_rollup_delta, но для списка переходов (old, new) сразу.
+
+    Изменения суммируются по дню, ребёнку и пользователю, и каждая сводная таблица
+    обновляется одним INSERT ... ON CONFLICT на всю пачку.
+    """
+    daily = {}
+    children = {}
     users = {}
-    for row in rows:
-        users[str(row['user_id'])] = {
-            'parent_name': row['parent_name'],
-            'phone': row['phone'],
-            'created_at': row['created_at']
-        }
-    return users
+    for old, new in changes:
+        for booking, sign in ((old, -1), (new, 1)):
+            if booking is None:
+                continue
+            cancelled = bool(booking.cancelled_by_user)
+            counts = daily.setdefault(_rollup_day(booking.timestamp), [0, 0, 0])
+            counts[0] += sign
+            if cancelled:
+                counts[2] += sign
+                users[booking.user_id] = users.get(booking.user_id, 0) + sign
+            else:
+                if booking.confirmed:
+                    counts[1] += sign
+                children[booking.child_name] = children.get(booking.child_name, 0) + sign
+
+    _upsert_rollup(cursor, 'rollup_daily', 'analytics_daily (day, created, confirmed, cancelled)', '''
+        ON CONFLICT (day) DO UPDATE SET
+            created = analytics_daily.created + EXCLUDED.created,
+            confirmed = analytics_daily.confirmed + EXCLUDED.confirmed,
+            cancelled = analytics_daily.cancelled + EXCLUDED.cancelled
+    ''', [(day,) + tuple(counts) for day, counts in daily.items() if any(counts)])
+    _upsert_rollup(cursor, 'rollup_children', 'analytics_children (child_name, bookings)', '''
+        ON CONFLICT (child_name) DO UPDATE SET bookings = analytics_children.bookings + EXCLUDED.bookings
+    ''', [(child_name, delta) for child_name, delta in children.items() if delta])
+    _upsert_rollup(cursor, 'rollup_user_cancellations', 'analytics_user_cancellations (user_id, cancellations)', '''
+        ON CONFLICT (user_id) DO UPDATE SET
+            cancellations = analytics_user_cancellations.cancellations + EXCLUDED.cancellations
+    ''', [(user_id, delta) for user_id, delta in users.items() if delta])
+
+def _upsert_rollup(cursor, name, target, on_conflict, rows):
+    if not rows:
+        return
+    values = ', '.join(['(' + ', '.join(['%s'] * len(rows[0])) + ')'] * len(rows))
+    query = f'INSERT INTO {target} VALUES {values} {on_conflict}'
+    params = [value for row in rows for value in row]
+    if len(rows) == 1:
+        # Одиночные изменения (запись, отмена) — частый запрос, он подготавливается
+        execute_prepared(cursor, name, query, params)
+    else:
+        cursor.execute(query, params)
+
+def _rebuild_analytics(cursor, include_archive=True):
+    backend = get_backend()
+    source = 'bookings'
+    if include_archive:
+        # Архивные записи по-прежнему учитываются в аналитике
+        columns = 'timestamp, confirmed, cancelled_by_user, child_name, user_id'
+        source = f'''(
+            SELECT {columns} FROM bookings
+            UNION ALL
+            SELECT {columns} FROM bookings_archive
+        ) AS all_bookings'''
+    backend.truncate(cursor, ['analytics_daily', 'analytics_children', 'analytics_user_cancellations'])
+    cursor.execute(f'''
+        INSERT INTO analytics_daily (day, created, confirmed, cancelled)
+        SELECT COALESCE({backend.date_of('timestamp')}, %s),
+               COUNT(*),
+               COUNT(*) FILTER (WHERE confirmed IS TRUE AND cancelled_by_user IS NOT TRUE),
+               COUNT(*) FILTER (WHERE cancelled_by_user IS TRUE)
+        FROM {source}
+        GROUP BY 1
+    ''', (ROLLUP_UNKNOWN_DAY,))
+    days = cursor.rowcount
+    cursor.execute(f'''
+        INSERT INTO analytics_children (child_name, bookings)
+        SELECT child_name, COUNT(*) FROM {source}
+        WHERE cancelled_by_user IS NOT TRUE
+        GROUP BY child_name
+    ''')
+    cursor.execute(f'''
+        INSERT INTO analytics_user_cancellations (user_id, cancellations)
+        SELECT user_id, COUNT(*) FROM {source}
+        WHERE cancelled_by_user IS TRUE
+        GROUP BY user_id
+    ''')
+    return days
+
+def rebuild_analytics_rollups(include_archive=True):
+    """Пересчитывает сводные таблицы по всей истории bookings и bookings_archive (одна транзакция).
+
+    include_archive=False — только по bookings (для схемы, где архива ещё нет).
+    Возвращает количество дней в analytics_daily.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        days = _rebuild_analytics(cursor, include_archive)
+        conn.commit()
+    return days
+
+# --- Функции для работы с пользователями ---
 
+@_invalidates('users')
 def save_user(user_id, parent_name, phone):
     """Сохраняет или обновляет данные пользователя в БД."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    # INSERT ... ON CONFLICT DO UPDATE (аналог REPLACE в SQLite)
-    cursor.execute('''
-        INSERT INTO users (user_id, parent_name, phone)
-        VALUES (%s, %s, %s)
-        ON CONFLICT (user_id)
-        DO UPDATE SET parent_name = EXCLUDED.parent_name, phone = EXCLUDED.phone;
-    ''', (user_id, parent_name, phone))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        # INSERT ... ON CONFLICT DO UPDATE (аналог REPLACE в SQLite)
+        cursor.execute('''
+            INSERT INTO users (user_id, parent_name, phone)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (user_id)
+            DO UPDATE SET parent_name = EXCLUDED.parent_name, phone = EXCLUDED.phone;
+        ''', (user_id, parent_name, phone))
+        _notify_changes(cursor, 'users')
+        conn.commit()
 
 # --- Функции для работы со слотами ---
 
-def load_slots():
-    """Загружает все слоты из БД и возвращает в старом формате (dict)."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, date, time, available, deleted_by_admin FROM slots ORDER BY date, time')
-    rows = cursor.fetchall()
-    conn.close()
+def load_slots(from_date=None, to_date=None, use_cache=True):
+    """Загружает слоты и возвращает в старом формате (dict: дата -> список Slot).
+
+    Даты идут в хронологическом порядке. from_date/to_date (datetime.date) ограничивают
+    диапазон [from_date, to_date) на стороне БД. Результат берётся из кэша, пока слоты
+    не менялись; возвращаемый словарь общий для всех вызывающих — не изменяйте его.
+    use_cache=False читает из БД в обход кэша.
+    """
+    if not use_cache:
+        return _load_slots_from_db(from_date, to_date)
+    return _slots_cache.get((from_date, to_date), lambda: _load_slots_from_db(from_date, to_date))
+
+def _load_slots_from_db(from_date, to_date):
+    conditions = []
+    params = []
+    if from_date is not None:
+        conditions.append('lesson_date >= %s')
+        params.append(from_date)
+    if to_date is not None:
+        conditions.append('lesson_date < %s')
+        params.append(to_date)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        execute_prepared(cursor, 'load_slots', f'''
+            SELECT {SLOT_COLUMNS}
+            FROM slots
+            {where}
+            ORDER BY starts_at NULLS LAST, id
+        ''', params)
+        rows = cursor.fetchall()
 
     slots = {}
-    for row in rows:
-        date = row['date']
-        if date not in slots:
-            slots[date] = []
-        slots[date].append({
-            'id': row['id'],
-            'time': row['time'],
-            'available': row['available'],
-            'deleted_by_admin': row['deleted_by_admin']
-        })
+    for slot in map(Slot._make, rows):
+        slots.setdefault(slot.date, []).append(slot)
     return slots
 
-def save_slots(slots_dict):
-    """Полностью перезаписывает слоты в БД из словаря."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def slots_horizon(today=None):
+    """Диапазон дат [from_date, to_date) для записи: с сегодняшнего дня на config.SLOTS_HORIZON_DAYS дней."""
+    today = today or datetime.now().date()
+    return today, today + timedelta(days=config.SLOTS_HORIZON_DAYS)
 
-    # Удаляем все старые слоты
-    cursor.execute('DELETE FROM slots')
+def load_bookable_slots(from_date=None, to_date=None, use_cache=True):
+    """Слоты, на которые можно записаться: свободные и не удалённые администратором.
 
-    # Вставляем новые слоты
-    for date, date_slots in slots_dict.items():
-        for slot in date_slots:
-            cursor.execute('''
-                INSERT INTO slots (date, time, available, deleted_by_admin)
-                VALUES (%s, %s, %s, %s)
-            ''', (date, slot['time'], slot.get('available', True), slot.get('deleted_by_admin', False)))
-
-    conn.commit()
-    conn.close()
+    Диапазон дат [from_date, to_date) по умолчанию — slots_horizon(). Запрос обслуживается
+    частичным индексом idx_slots_open_starts_at (только открытые слоты), так что занятые,
+    удалённые и прошедшие слоты не читаются вовсе. Формат и кэширование — как у load_slots:
+    dict дата -> список Slot в хронологическом порядке; даты без свободных слотов отсутствуют.
+    """
+    default_from, default_to = slots_horizon()
+    from_date = from_date or default_from
+    to_date = to_date or default_to
+    if not use_cache:
+        return _load_bookable_slots_from_db(from_date, to_date)
+    return _slots_cache.get(('bookable', from_date, to_date),
+                            lambda: _load_bookable_slots_from_db(from_date, to_date))
 
-def add_slot(date, time, available=True):
-    """Добавляет новый слот в БД."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute('''
-            INSERT INTO slots (date, time, available)
-            VALUES (%s, %s, %s)
-        ''', (date, time, available))
-        conn.commit()
-    except psycopg2.IntegrityError:
-        print(f"Слот {date} {time} уже существует.")
-    conn.close()
-
-def update_slot(slot_id, available=None, deleted_by_admin=None):
-    """Обновляет статус слота по ID."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    updates = []
-    params = []
+def _load_bookable_slots_from_db(from_date, to_date):
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        # Условие повторяет предикат частичного индекса — иначе планировщик его не выберет
+        execute_prepared(cursor, 'load_bookable_slots', f'''
+            SELECT {SLOT_COLUMNS}
+            FROM slots
+            WHERE available = TRUE AND deleted_by_admin = FALSE
+            AND starts_at >= %s AND starts_at < %s
+            ORDER BY starts_at, id
+        ''', (datetime.combine(from_date, datetime.min.time()), datetime.combine(to_date, datetime.min.time())))
+        rows = cursor.fetchall()
 
-    if available is not None:
-        updates.append('available = %s')
-        params.append(available)
-    if deleted_by_admin is not None:
-        updates.append('deleted_by_admin = %s')
-        params.append(deleted_by_admin)
+    slots = {}
+    for slot in map(Slot._make, rows):
+        slots.setdefault(slot.date, []).append(slot)
+    return slots
 
-    if updates:
-        params.append(slot_id)
-        query = f"UPDATE slots SET {', '.join(updates)} WHERE id = %s"
-        cursor.execute(query, params)
+@_invalidates_slots
+def add_slots(date, times):
+    """Добавляет слоты на дату, пропуская уже существующие. Возвращает список добавленных времён."""
+    added = []
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        for slot_time in times:
+            cursor.execute('''
+                INSERT INTO slots (date, time, available, lesson_date, start_time, end_time, starts_at)
+                VALUES (%s, %s, TRUE, %s, %s, %s, %s)
+                ON CONFLICT (date, time) DO NOTHING
+                RETURNING time
+            ''', (date, slot_time) + _typed_columns(date, slot_time))
+            if cursor.fetchone() is not None:
+                added.append(slot_time)
+        if added:
+            _notify_changes(cursor, 'slots')
         conn.commit()
-    conn.close()
+    return added
 
-def delete_slot_by_datetime(date, time):
-    """Удаляет слот по дате и времени (ставит deleted_by_admin = 1)."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def _release_slot(cursor, date, time):
     cursor.execute('''
-        UPDATE slots SET deleted_by_admin = TRUE, available = FALSE WHERE date = %s AND time = %s
+        UPDATE slots SET available = TRUE
+        WHERE date = %s AND time = %s AND deleted_by_admin = FALSE
     ''', (date, time))
-    conn.commit()
-    conn.close()
 
-# --- Функции для работы с записями ---
+def _release_slots(cursor, slots):
+    """Освобождает слоты [(дата, время)] одним UPDATE."""
+    values = ', '.join(['(%s, %s)'] * len(slots))
+    cursor.execute(f'''
+        UPDATE slots SET available = TRUE
+        WHERE (date, time) IN (VALUES {values}) AND deleted_by_admin = FALSE
+    ''', [value for slot in slots for value in slot])
 
-def load_bookings():
-    """Загружает все записи из БД и возвращает в старом формате (list)."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    # ИЗМЕНЕНО: SELECT теперь включает parent_name
-    cursor.execute('''
-        SELECT id, user_id, date, time, child_name, phone, parent_name, timestamp, confirmed, cancelled_by_user, cancelled_by_admin
-        FROM bookings
-        ORDER BY date, time
-    ''')
-    rows = cursor.fetchall()
-    conn.close()
-
-    bookings = []
-    for row in rows:
-        bookings.append({
-            'id': row['id'],
-            'user_id': row['user_id'],
-            'date': row['date'],
-            'time': row['time'],
-            'child_name': row['child_name'],
-            'phone': row['phone'],
-            'parent_name': row['parent_name'], # <-- НОВОЕ ПОЛЕ
-            'timestamp': row['timestamp'],
-            'confirmed': row['confirmed'],
-            'cancelled_by_user': row['cancelled_by_user'],
-            'cancelled_by_admin': row['cancelled_by_admin']
-        })
-    return bookings
+@_invalidates('slots', 'bookings')
+def mark_slot_deleted(slot_id):
+    """Помечает слот удалённым администратором и отменяет активные записи на него.
 
-def save_booking(booking_data):
-    """Сохраняет новую запись в БД."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    Возвращает (слот, список user_id затронутых клиентов) или None, если слот не найден
+    или уже удалён.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            UPDATE slots SET deleted_by_admin = TRUE, available = FALSE
+            WHERE id = %s AND deleted_by_admin = FALSE
+            RETURNING {SLOT_COLUMNS}
+        ''', (slot_id,))
+        row = cursor.fetchone()
+        if row is None:
+            conn.commit()
+            return None
+        slot = Slot._make(row)
+
+        cursor.execute('''
+            UPDATE bookings SET cancelled_by_admin = TRUE
+            WHERE date = %s AND time = %s
+            AND cancelled_by_user = FALSE AND cancelled_by_admin = FALSE
+            RETURNING user_id
+        ''', (slot.date, slot.time))
+        affected_users = [row[0] for row in cursor.fetchall()]
+        _notify_changes(cursor, 'slots', 'bookings')
+        conn.commit()
+
+    return slot, affected_users
+
+# --- Функции для работы с записями ---
+
+def _insert_booking(cursor, booking_data):
+    """INSERT записи с обновлением сводных таблиц; возвращает Booking."""
     # ИЗМЕНЕНО: INSERT теперь включает parent_name
-    cursor.execute('''
-        INSERT INTO bookings (user_id, date, time, child_name, phone, parent_name, confirmed, cancelled_by_user, cancelled_by_admin)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    execute_prepared(cursor, 'insert_booking', f'''
+        INSERT INTO bookings (user_id, date, time, child_name, phone, parent_name, confirmed, cancelled_by_user, cancelled_by_admin,
+                              lesson_date, start_time, end_time, starts_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING {BOOKING_COLUMNS}
     ''', (
         booking_data['user_id'],
         booking_data['date'],
@@ -255,169 +691,582 @@ def save_booking(booking_data):
         booking_data.get('confirmed', False),
         booking_data.get('cancelled_by_user', False),
         booking_data.get('cancelled_by_admin', False)
-    ))
-    conn.commit()
-    conn.close()
+    ) + _typed_columns(booking_data['date'], booking_data['time']))
+    booking = Booking._make(cursor.fetchone())
+    _apply_rollup_delta(cursor, new=booking)
+    return booking
+
+@_invalidates('bookings')
+def save_booking(booking_data):
+    """Сохраняет новую запись в БД и возвращает её (Booking).
 
-def save_bookings(bookings_list):
-    """Полностью перезаписывает все записи в БД."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    Слот не занимается — для записи клиента используйте book_slot.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        booking = _insert_booking(cursor, booking_data)
+        _notify_changes(cursor, 'bookings')
+        conn.commit()
 
-    # Удаляем все старые записи
-    cursor.execute('DELETE FROM bookings')
+    return booking
 
-    # Вставляем новые записи (ИЗМЕНЕНО: включая parent_name)
-    for booking in bookings_list:
-        cursor.execute('''
-            INSERT INTO bookings (user_id, date, time, child_name, phone, parent_name, timestamp, confirmed, cancelled_by_user, cancelled_by_admin)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ''', (
-            booking['user_id'],
-            booking['date'],
-            booking['time'],
-            booking['child_name'],
-            booking['phone'],
-            booking.get('parent_name'), # <-- Используем parent_name из booking
-            booking.get('timestamp', datetime.now()),
-            booking.get('confirmed', False),
-            booking.get('cancelled_by_user', False),
-            booking.get('cancelled_by_admin', False)
-        ))
-
-    conn.commit()
-    conn.close()
-
-def update_booking(booking_id, confirmed=None, cancelled_by_user=None, cancelled_by_admin=None, parent_name=None):
-    """Обновляет статус записи по ID."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    updates = []
-    params = []
+# Результаты book_slot
+BOOKING_CREATED = 'created'
+BOOKING_SLOT_TAKEN = 'slot_taken'
+
+@_invalidates('slots', 'bookings')
+def book_slot(booking_data):
+    """Атомарно занимает слот и создаёт на него запись.
+
+    Условный UPDATE слота и INSERT записи выполняются в одной транзакции: из
+    одновременных подтверждений одного слота проходит ровно одно (строка слота
+    блокируется UPDATE, остальные после ожидания видят available = FALSE).
+    Дополнительно одну активную запись на слот гарантирует частичный уникальный
+    индекс idx_bookings_active_slot.
+
+    Возвращает (BOOKING_CREATED, Booking) или (BOOKING_SLOT_TAKEN, None), если слот
+    уже занят или удалён.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        execute_prepared(cursor, 'reserve_slot', '''
+            UPDATE slots SET available = FALSE
+            WHERE date = %s AND time = %s AND available = TRUE AND deleted_by_admin = FALSE
+            RETURNING id
+        ''', (booking_data['date'], booking_data['time']))
+        if cursor.fetchone() is None:
+            conn.rollback()
+            return BOOKING_SLOT_TAKEN, None
+        try:
+            booking = _insert_booking(cursor, booking_data)
+        except get_backend().IntegrityError as e:
+            conn.rollback()
+            if get_backend().is_unique_violation(e):
+                return BOOKING_SLOT_TAKEN, None
+            raise
+        _notify_changes(cursor, 'slots', 'bookings')
+        conn.commit()
+
+    return BOOKING_CREATED, booking
 
-    if confirmed is not None:
-        updates.append('confirmed = %s')
-        params.append(confirmed)
-    if cancelled_by_user is not None:
-        updates.append('cancelled_by_user = %s')
-        params.append(cancelled_by_user)
-    if cancelled_by_admin is not None:
-        updates.append('cancelled_by_admin = %s')
-        params.append(cancelled_by_admin)
-    if parent_name is not None: # <-- Возможность обновить parent_name
-        updates.append('parent_name = %s')
-        params.append(parent_name)
-
-    if updates:
+def _booking_condition(booking_id=None, user_id=None, date=None, time=None):
+    """Собирает WHERE для поиска записи по ID или по (user_id, дата, время)."""
+    conditions = []
+    params = []
+    if booking_id is not None:
+        conditions.append('id = %s')
         params.append(booking_id)
-        query = f"UPDATE bookings SET {', '.join(updates)} WHERE id = %s"
-        cursor.execute(query, params)
+    if user_id is not None:
+        conditions.append('user_id = %s')
+        params.append(user_id)
+    if date is not None:
+        conditions.append('date = %s')
+        params.append(date)
+    if time is not None:
+        conditions.append('time = %s')
+        params.append(time)
+    if not conditions:
+        raise ValueError("Не указано, какую запись изменять")
+    return ' AND '.join(conditions), params
+
+@_invalidates('slots', 'bookings')
+def cancel_booking(booking_id=None, user_id=None, date=None, time=None):
+    """Отменяет активную запись клиентом и освобождает её слот в одной транзакции.
+
+    Запись ищется по ID и/или по (user_id, дата, время). Возвращает отменённую запись
+    (Booking) или None, если активная запись не найдена.
+    """
+    where, params = _booking_condition(booking_id, user_id, date, time)
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        # Условие на статус повторяется во внешнем WHERE: подзапрос вычисляется один раз,
+        # а после ожидания блокировки PostgreSQL перепроверяет только внешнее условие —
+        # без него одновременная отмена той же записи прошла бы второй раз
+        cursor.execute(f'''
+            UPDATE bookings SET cancelled_by_user = TRUE
+            WHERE id = (
+                SELECT id FROM bookings
+                WHERE {where} AND cancelled_by_user = FALSE AND cancelled_by_admin = FALSE
+                ORDER BY id
+                LIMIT 1
+            )
+            AND cancelled_by_user = FALSE AND cancelled_by_admin = FALSE
+            RETURNING {BOOKING_COLUMNS}
+        ''', params)
+        row = cursor.fetchone()
+        booking = Booking._make(row) if row is not None else None
+        if booking is not None:
+            _release_slot(cursor, booking.date, booking.time)
+            _apply_rollup_delta(cursor, booking._replace(cancelled_by_user=False), booking)
+            _notify_changes(cursor, 'slots', 'bookings')
         conn.commit()
-    conn.close()
 
-def delete_booking_by_datetime_user_id(date, time, user_id):
-    """Удаляет запись по дате, времени и user_id (ставит cancelled_by_user = 1)."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE bookings SET cancelled_by_user = TRUE WHERE date = %s AND time = %s AND user_id = %s
-    ''', (date, time, user_id))
-    conn.commit()
-    conn.close()
+    return booking
+
+@_invalidates('bookings')
+def confirm_booking(booking_id=None, user_id=None, date=None, time=None):
+    """Подтверждает активную запись. Возвращает подтверждённую запись (Booking) или None."""
+    where, params = _booking_condition(booking_id, user_id, date, time)
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        # Прежнее значение confirmed нужно для сводных таблиц аналитики
+        cursor.execute(f'''
+            SELECT {BOOKING_COLUMNS} FROM bookings
+            WHERE {where} AND cancelled_by_user = FALSE AND cancelled_by_admin = FALSE
+            ORDER BY id
+            FOR UPDATE
+        ''', params)
+        confirmed = []
+        for booking in map(Booking._make, cursor.fetchall()):
+            if not booking.confirmed:
+                cursor.execute('UPDATE bookings SET confirmed = TRUE WHERE id = %s', (booking.id,))
+                _apply_rollup_delta(cursor, booking, booking._replace(confirmed=True))
+            confirmed.append(booking._replace(confirmed=True))
+        if confirmed:
+            _notify_changes(cursor, 'bookings')
+        conn.commit()
+
+    return confirmed[0] if confirmed else None
+
+# Ответы на напоминание (data.apply_reminder_responses)
+REMINDER_CONFIRM = 'confirm'
+REMINDER_CANCEL = 'cancel'
+
+@_invalidates('slots', 'bookings')
+def apply_reminder_responses(responses):
+    """Применяет пачку ответов на напоминания одной транзакцией.
+
+    responses — список (user_id, дата, время, REMINDER_CONFIRM/REMINDER_CANCEL); для одной
+    записи действует последний ответ. Подтверждения и отмены записываются одним UPDATE
+    на каждый вид (UPDATE ... FROM (VALUES ...) в PostgreSQL), слоты отменённых записей
+    освобождаются одним UPDATE, а сводные таблицы — одним upsert на таблицу.
+    Ответы на уже отменённые или несуществующие записи пропускаются.
+    Возвращает (подтверждено, отменено).
+    """
+    actions = {}
+    for user_id, date, slot_time, action in responses:
+        actions[(user_id, date, slot_time)] = action
+    if not actions:
+        return 0, 0
+
+    values = ', '.join(['(%s, %s, %s)'] * len(actions))
+    params = [value for key in actions for value in key]
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {BOOKING_COLUMNS} FROM bookings
+            WHERE (user_id, date, time) IN (VALUES {values})
+            AND cancelled_by_user = FALSE AND cancelled_by_admin = FALSE
+            ORDER BY id
+            FOR UPDATE
+        ''', params)
+
+        confirmed_ids = []
+        cancelled_ids = []
+        released_slots = []
+        changes = []
+        for booking in map(Booking._make, cursor.fetchall()):
+            action = actions[(booking.user_id, booking.date, booking.time)]
+            if action == REMINDER_CANCEL:
+                cancelled_ids.append((booking.id, True))
+                released_slots.append((booking.date, booking.time))
+                changes.append((booking, booking._replace(cancelled_by_user=True)))
+            elif not booking.confirmed:
+                confirmed_ids.append((booking.id, True))
+                changes.append((booking, booking._replace(confirmed=True)))
+
+        # Число запросов не зависит от размера пачки: по одному на каждый вид изменений
+        backend = get_backend()
+        if confirmed_ids:
+            backend.bulk_update(cursor, 'bookings', [('confirmed', 'BOOLEAN')], confirmed_ids)
+        if cancelled_ids:
+            backend.bulk_update(cursor, 'bookings', [('cancelled_by_user', 'BOOLEAN')], cancelled_ids)
+            _release_slots(cursor, released_slots)
+        if changes:
+            _apply_rollup_deltas(cursor, changes)
+            _notify_changes(cursor, 'slots', 'bookings')
+        conn.commit()
+
+    return len(confirmed_ids), len(cancelled_ids)
+
+def load_user_bookings(user_id, upcoming_only=True, include_cancelled_by_admin=True):
+    """Загружает записи клиента (кроме отменённых им самим) вместе со статусом слота.
+
+    Один запрос по индексу idx_bookings_user_starts_at. upcoming_only оставляет занятия
+    с сегодняшнего дня. Возвращает список UserBooking: поля записи плюс slot_exists,
+    slot_available и slot_deleted_by_admin.
+    """
+    conditions = ['b.user_id = %s', 'b.cancelled_by_user = FALSE']
+    params = [user_id]
+    if not include_cancelled_by_admin:
+        conditions.append('b.cancelled_by_admin = FALSE')
+    if upcoming_only:
+        conditions.append('b.starts_at >= %s')
+        params.append(datetime.combine(datetime.now().date(), datetime.min.time()))
+
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        execute_prepared(cursor, 'load_user_bookings', f'''
+            SELECT {_columns(Booking, 'b')},
+                   s.id IS NOT NULL AS slot_exists,
+                   COALESCE(s.available, TRUE) AS slot_available,
+                   COALESCE(s.deleted_by_admin, FALSE) AS slot_deleted_by_admin
+            FROM bookings b
+            LEFT JOIN slots s ON s.date = b.date AND s.time = b.time
+            WHERE {' AND '.join(conditions)}
+            ORDER BY b.starts_at NULLS LAST, b.id
+        ''', params)
+        rows = cursor.fetchall()
+
+    return list(map(UserBooking._make, rows))
+
+def get_booking(booking_id):
+    """Загружает одну запись по ID (Booking или None)."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {BOOKING_COLUMNS}
+            FROM bookings
+            WHERE id = %s
+        ''', (booking_id,))
+        row = cursor.fetchone()
+
+    return Booking._make(row) if row is not None else None
 
 # --- Функции для работы с домашними заданиями ---
 
 def save_homework(booking_id, file_id, file_type, comment, sent_by_admin_id):
     """Сохраняет домашнее задание в БД."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO homeworks (booking_id, file_id, file_type, comment, sent_by_admin_id)
-        VALUES (%s, %s, %s, %s, %s)
-    ''', (booking_id, file_id, file_type, comment, sent_by_admin_id))
-    conn.commit()
-    conn.close()
-
-def load_homeworks_for_user(user_id):
-    """Загружает все ДЗ для конкретного пользователя."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    # Присоединяем bookings, чтобы получить booking_id, связанный с user_id
-    cursor.execute('''
-        SELECT h.id, h.booking_id, h.file_id, h.file_type, h.comment, h.sent_at, h.sent_by_admin_id
-        FROM homeworks h
-        JOIN bookings b ON h.booking_id = b.id
-        WHERE b.user_id = %s
-        ORDER BY h.sent_at DESC
-    ''', (user_id,))
-    rows = cursor.fetchall()
-    conn.close()
-
-    homeworks = []
-    for row in rows:
-        homeworks.append({
-            'id': row['id'],
-            'booking_id': row['booking_id'],
-            'file_id': row['file_id'],
-            'file_type': row['file_type'],
-            'comment': row['comment'],
-            'sent_at': row['sent_at'],
-            'sent_by_admin_id': row['sent_by_admin_id']
-        })
-    return homeworks
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO homeworks (booking_id, file_id, file_type, comment, sent_by_admin_id)
+            VALUES (%s, %s, %s, %s, %s)
+        ''', (booking_id, file_id, file_type, comment, sent_by_admin_id))
+        conn.commit()
 
-def load_homeworks_by_booking_id(booking_id):
-    """Загружает ДЗ по ID записи."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT id, file_id, file_type, comment, sent_at, sent_by_admin_id
-        FROM homeworks
-        WHERE booking_id = %s
-        ORDER BY sent_at DESC
-    ''', (booking_id,))
-    rows = cursor.fetchall()
-    conn.close()
-
-    homeworks = []
-    for row in rows:
-        homeworks.append({
-            'id': row['id'],
-            'file_id': row['file_id'],
-            'file_type': row['file_type'],
-            'comment': row['comment'],
-            'sent_at': row['sent_at'],
-            'sent_by_admin_id': row['sent_by_admin_id']
+def load_homeworks_for_user(user_id, limit=None, offset=0):
+    """Загружает ДЗ клиента (UserHomework) вместе с датой, временем и ребёнком из записи.
+
+    Один запрос: записи клиента ищутся по idx_bookings_user_starts_at, их ДЗ — по
+    idx_homeworks_booking_id; ДЗ по архивным записям берутся из архива. Новые ДЗ идут
+    первыми; limit/offset задают страницу.
+    """
+    params = [user_id, user_id]
+    page = ''
+    if limit is not None:
+        page = 'LIMIT %s OFFSET %s'
+        params += [limit, offset]
+
+    with db_read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {_columns(UserHomework)} FROM (
+                SELECT {_columns(Homework, 'h')}, b.date AS booking_date, b.time AS booking_time, b.child_name
+                FROM homeworks h
+                JOIN bookings b ON h.booking_id = b.id
+                WHERE b.user_id = %s
+                UNION ALL
+                SELECT {_columns(Homework, 'h')}, b.date, b.time, b.child_name
+                FROM homeworks_archive h
+                JOIN bookings_archive b ON h.booking_id = b.id
+                WHERE b.user_id = %s
+            ) AS user_homeworks
+            ORDER BY sent_at DESC, id DESC
+            {page}
+        ''', params)
+        rows = cursor.fetchall()
+
+    return list(map(UserHomework._make, rows))
+
+def load_active_bookings_between(start, end):
+    """Загружает неотменённые записи, занятия по которым начинаются в [start, end)."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {BOOKING_COLUMNS}
+            FROM bookings
+            WHERE cancelled_by_user = FALSE AND cancelled_by_admin = FALSE
+            AND starts_at >= %s AND starts_at < %s
+            ORDER BY starts_at, id
+        ''', (start, end))
+        rows = cursor.fetchall()
+
+    return list(map(Booking._make, rows))
+
+# --- Аналитика ---
+
+ANALYTICS_TOP_LIMIT = 5
+
+def load_booking_analytics(today=None, top_limit=ANALYTICS_TOP_LIMIT):
+    """Возвращает сводку для экрана аналитики, читая только сводные таблицы.
+
+    Возвращает dict: all (всего записей), total (не отменённые клиентом), confirmed,
+    unconfirmed, cancelled, week/month/year (созданные за последние 7/30/365 дней,
+    с точностью до дня), top_children и top_cancelling_users — списки пар
+    (имя/ID, количество).
+    """
+    today = today or datetime.now().date()
+    with db_read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT COALESCE(SUM(created), 0),
+                   COALESCE(SUM(created - cancelled), 0),
+                   COALESCE(SUM(confirmed), 0),
+                   COALESCE(SUM(cancelled), 0),
+                   COALESCE(SUM(created - cancelled) FILTER (WHERE day > %(week)s), 0),
+                   COALESCE(SUM(created - cancelled) FILTER (WHERE day > %(month)s), 0),
+                   COALESCE(SUM(created - cancelled) FILTER (WHERE day > %(year)s), 0)
+            FROM analytics_daily
+        ''', {
+            'week': today - timedelta(days=7),
+            'month': today - timedelta(days=30),
+            'year': today - timedelta(days=365),
         })
-    return homeworks
+        all_count, total, confirmed, cancelled, week, month, year = cursor.fetchone()
 
-def load_past_bookings_for_homework():
-    """Загружает прошедшие и неотменённые записи, для которых можно отправить ДЗ."""
-    from datetime import datetime
-    now = datetime.now()
+        # Оба рейтинга одним запросом; kind различает строки
+        cursor.execute('''
+            SELECT * FROM (
+                SELECT 'child' AS kind, child_name AS name, bookings AS cnt
+                FROM analytics_children
+                WHERE bookings > 0
+                ORDER BY bookings DESC, child_name
+                LIMIT %(limit)s
+            ) AS top_children
+            UNION ALL
+            SELECT * FROM (
+                SELECT 'user' AS kind, CAST(user_id AS TEXT) AS name, cancellations AS cnt
+                FROM analytics_user_cancellations
+                WHERE cancellations > 0
+                ORDER BY cancellations DESC, user_id
+                LIMIT %(limit)s
+            ) AS top_users
+        ''', {'limit': top_limit})
+        top_rows = cursor.fetchall()
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    # Сравниваем дату и время записи с текущим
-    cursor.execute('''
-        SELECT id, user_id, date, time, child_name, phone, parent_name -- <-- parent_name добавлено сюда
+    # UNION ALL не гарантирует порядок строк между ветками, поэтому сортируем здесь (<= 2 * limit строк)
+    top_rows.sort(key=lambda r: -r[2])
+    return {
+        'all': all_count,
+        'total': total,
+        'confirmed': confirmed,
+        'unconfirmed': total - confirmed,
+        'cancelled': cancelled,
+        'week': week,
+        'month': month,
+        'year': year,
+        'top_children': [(name, cnt) for kind, name, cnt in top_rows if kind == 'child'],
+        'top_cancelling_users': [(int(name), cnt) for kind, name, cnt in top_rows if kind == 'user'],
+    }
+
+# --- Постраничная выборка (keyset) ---
+
+# Страницы упорядочены по (starts_at, id). Курсор — непрозрачная короткая строка
+# (помещается в callback_data), указывающая на последнюю строку предыдущей страницы.
+# Строки без starts_at (нераспознанная дата) в постраничные выборки не попадают.
+
+BOOKING_STATUS_FILTERS = {
+    'active': 'cancelled_by_user = FALSE AND cancelled_by_admin = FALSE',
+    'confirmed': 'confirmed = TRUE AND cancelled_by_user = FALSE AND cancelled_by_admin = FALSE',
+    'cancelled': '(cancelled_by_user = TRUE OR cancelled_by_admin = TRUE)',
+}
+
+SLOT_STATUS_FILTERS = {
+    'free': 'available = TRUE AND deleted_by_admin = FALSE',
+    'booked': 'available = FALSE AND deleted_by_admin = FALSE',
+    'active': 'deleted_by_admin = FALSE',
+    'deleted': 'deleted_by_admin = TRUE',
+}
+
+def _encode_cursor(starts_at, row_id):
+    raw = f"{starts_at:%Y%m%d%H%M%S}.{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def _decode_cursor(cursor):
+    """Разбирает курсор в (starts_at, id); для испорченного курсора — ValueError."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        starts_at_str, row_id = raw.split('.', 1)
+        return datetime.strptime(starts_at_str, "%Y%m%d%H%M%S"), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Некорректный курсор страницы: {cursor!r}") from e
+
+def _page_filters(status, status_filters, from_date, to_date):
+    conditions = []
+    params = []
+    if status is not None:
+        if status not in status_filters:
+            raise ValueError(f"Неизвестный статус: {status!r}")
+        conditions.append(status_filters[status])
+    if from_date is not None:
+        conditions.append('lesson_date >= %s')
+        params.append(from_date)
+    if to_date is not None:
+        conditions.append('lesson_date < %s')
+        params.append(to_date)
+    return conditions, params
+
+def _fetch_page(record_cls, select_sql, conditions, params, page_size, cursor, descending=False, replica=True):
+    """Выполняет keyset-запрос. Возвращает (записи record_cls, курсор следующей страницы или None).
+
+    replica=False — для экранов, которые должны сразу видеть только что сделанные
+    изменения: страница читается с основной БД.
+    """
+    conditions = list(conditions) + ['starts_at IS NOT NULL']
+    params = list(params)
+    if cursor:
+        after_starts_at, after_id = _decode_cursor(cursor)
+        conditions.append(f"(starts_at, id) {'<' if descending else '>'} (%s, %s)")
+        params += [after_starts_at, after_id]
+    order = 'DESC' if descending else 'ASC'
+    params.append(page_size + 1)
+
+    with (db_read_connection() if replica else db_connection()) as conn:
+        db_cursor = conn.cursor()
+        db_cursor.execute(f'''
+            {select_sql}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY starts_at {order}, id {order}
+            LIMIT %s
+        ''', params)
+        rows = db_cursor.fetchall()
+
+    # Одна лишняя строка показывает, есть ли следующая страница
+    has_more = len(rows) > page_size
+    records = list(map(record_cls._make, rows[:page_size]))
+    next_cursor = _encode_cursor(records[-1].starts_at, records[-1].id) if has_more else None
+    return records, next_cursor
+
+def load_slots_page(page_size=30, cursor=None, status=None, from_date=None, to_date=None, replica=True):
+    """Страница слотов в порядке начала (status — один из SLOT_STATUS_FILTERS).
+
+    Возвращает (список Slot, курсор следующей страницы). replica — как у _fetch_page.
+    """
+    conditions, params = _page_filters(status, SLOT_STATUS_FILTERS, from_date, to_date)
+    return _fetch_page(Slot, f'''
+        SELECT {SLOT_COLUMNS}
+        FROM slots
+    ''', conditions, params, page_size, cursor, replica=replica)
+
+def load_past_bookings_for_homework_page(page_size=10, cursor=None, replica=True):
+    """Страница прошедших неотменённых записей для отправки ДЗ, от новых к старым."""
+    return _fetch_page(Booking, f'''
+        SELECT {BOOKING_COLUMNS}
         FROM bookings
-        WHERE cancelled_by_user = FALSE AND cancelled_by_admin = FALSE
-        AND to_timestamp(date || ' ' || left(time, 5), 'DD.MM.YYYY HH24:MI') < %s
-        ORDER BY date DESC, time DESC
-    ''', (now,))
-    rows = cursor.fetchall()
-    conn.close()
-
-    bookings = []
-    for row in rows:
-        bookings.append({
-            'id': row['id'],
-            'user_id': row['user_id'],
-            'date': row['date'],
-            'time': row['time'],
-            'child_name': row['child_name'],
-            'phone': row['phone'],
-            'parent_name': row['parent_name'], # <-- parent_name добавлено сюда
-        })
-    return bookings
+    ''', [BOOKING_STATUS_FILTERS['active'], 'starts_at < %s'], [datetime.now()],
+        page_size, cursor, descending=True, replica=replica)
+
+# Статусы записей в обзоре администратора (вычисляются в БД)
+OVERVIEW_STATUS_CANCELLED_BY_USER = 'cancelled_by_user'
+OVERVIEW_STATUS_CANCELLED_BY_ADMIN = 'cancelled_by_admin'
+OVERVIEW_STATUS_SLOT_DELETED = 'slot_deleted'
+OVERVIEW_STATUS_CONFIRMED = 'confirmed'
+OVERVIEW_STATUS_PENDING = 'pending'
+
+def load_bookings_overview_page(page_size=10, cursor=None, status=None, from_date=None, to_date=None,
+                                archived=False, replica=True):
+    """Страница обзора записей для администратора — один запрос на страницу.
+
+    Записи соединяются со слотами и пользователями; к каждой добавляются имя родителя
+    из users (или из самой записи) и вычисленный overview_status (OVERVIEW_STATUS_*).
+    status — один из BOOKING_STATUS_FILTERS, from_date/to_date — диапазон дат занятий
+    [from_date, to_date). Возвращает (список BookingOverview, курсор следующей страницы).
+    archived=True — история из bookings_archive, от новых занятий к старым;
+    replica — как у _fetch_page.
+    """
+    suffix = '_archive' if archived else ''
+    conditions, params = _page_filters(status, BOOKING_STATUS_FILTERS, from_date, to_date)
+    # Подзапрос без агрегатов PostgreSQL «разворачивает», так что фильтры и ORDER BY
+    # по (starts_at, id) по-прежнему обслуживаются индексом bookings
+    return _fetch_page(BookingOverview, f'''
+        SELECT {_columns(BookingOverview)} FROM (
+            SELECT b.id, b.user_id, b.date, b.time, b.child_name, b.phone,
+                   COALESCE(u.parent_name, b.parent_name) AS parent_name,
+                   b.timestamp, b.confirmed, b.cancelled_by_user, b.cancelled_by_admin,
+                   b.lesson_date, b.starts_at,
+                   CASE
+                       WHEN b.cancelled_by_user THEN '{OVERVIEW_STATUS_CANCELLED_BY_USER}'
+                       WHEN b.cancelled_by_admin THEN '{OVERVIEW_STATUS_CANCELLED_BY_ADMIN}'
+                       WHEN s.id IS NULL OR s.deleted_by_admin THEN '{OVERVIEW_STATUS_SLOT_DELETED}'
+                       WHEN NOT s.available THEN '{OVERVIEW_STATUS_CONFIRMED}'
+                       ELSE '{OVERVIEW_STATUS_PENDING}'
+                   END AS overview_status
+            FROM bookings{suffix} b
+            LEFT JOIN slots{suffix} s ON s.date = b.date AND s.time = b.time
+            LEFT JOIN users u ON u.user_id = b.user_id
+        ) AS overview
+    ''', conditions, params, page_size, cursor, descending=archived, replica=replica)
+
+# --- Архив прошедших занятий ---
+
+# Слоты и записи, занятия которых прошли раньше горизонта (config.ARCHIVE_AFTER_DAYS),
+# переносятся в slots_archive и bookings_archive (ДЗ этих записей — в homeworks_archive)
+# с теми же id, поэтому в горячих таблицах остаются только ближайшие недели. Сводные
+# таблицы аналитики при переносе не меняются: архивные записи в них уже учтены.
+
+ARCHIVE_COLUMNS = {
+    'slots': 'id, date, time, available, deleted_by_admin, lesson_date, start_time, end_time, starts_at',
+    'bookings': ('id, user_id, date, time, child_name, phone, parent_name, timestamp, confirmed, '
+                 'cancelled_by_user, cancelled_by_admin, lesson_date, start_time, end_time, starts_at'),
+    'homeworks': HOMEWORK_COLUMNS,
+}
+
+def archive_horizon(today=None, days=None):
+    """Граница архива: начало дня days (config.ARCHIVE_AFTER_DAYS) дней назад."""
+    today = today or datetime.now().date()
+    if days is None:
+        days = config.ARCHIVE_AFTER_DAYS
+    return datetime.combine(today - timedelta(days=days), datetime.min.time())
+
+def _move_to_archive(cursor, table, key, ids):
+    placeholders = ', '.join(['%s'] * len(ids))
+    columns = ARCHIVE_COLUMNS[table]
+    cursor.execute(f'''
+        INSERT INTO {table}_archive ({columns})
+        SELECT {columns} FROM {table}
+        WHERE {key} IN ({placeholders})
+    ''', ids)
+    cursor.execute(f'DELETE FROM {table} WHERE {key} IN ({placeholders})', ids)
+
+@_invalidates('slots', 'bookings')
+def archive_past(before=None, batch_size=None):
+    """Переносит слоты и записи с началом занятия раньше before в архивные таблицы.
+
+    По умолчанию before — archive_horizon(). Перенос идёт пачками по batch_size строк
+    (config.ARCHIVE_BATCH_SIZE), каждая пачка — отдельная короткая транзакция;
+    строки пачки блокируются (FOR UPDATE), чтобы параллельные изменения не потерялись.
+    Возвращает (перенесено слотов, перенесено записей).
+    """
+    before = before or archive_horizon()
+    batch_size = batch_size or config.ARCHIVE_BATCH_SIZE
+    moved = {'slots': 0, 'bookings': 0}
+
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        for table in ('bookings', 'slots'):
+            while True:
+                cursor.execute(f'''
+                    SELECT id FROM {table}
+                    WHERE starts_at < %s
+                    ORDER BY starts_at, id
+                    LIMIT %s
+                    FOR UPDATE
+                ''', (before, batch_size))
+                ids = [row[0] for row in cursor.fetchall()]
+                if not ids:
+                    conn.rollback()
+                    break
+                if table == 'bookings':
+                    # ДЗ ссылаются на записи, поэтому переезжают вместе с ними
+                    _move_to_archive(cursor, 'homeworks', 'booking_id', ids)
+                _move_to_archive(cursor, table, 'id', ids)
+                _notify_changes(cursor, 'slots', 'bookings')
+                conn.commit()
+                moved[table] += len(ids)
+
+    if moved['slots'] or moved['bookings']:
+        print(f"Архив: перенесено слотов {moved['slots']}, записей {moved['bookings']} (занятия до {before:%d.%m.%Y})")
+    return moved['slots'], moved['bookings']
+
+_instrument()
@@ -0,0 +1,78 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import data
+
+# Асинхронный вариант data.py для asyncio-обработчиков и фоновых задач.
+#
+# Для функций data.py, обращающихся к БД (ASYNC_FUNCTIONS), здесь есть одноимённые
+# корутины с теми же аргументами и тем же результатом (те же записи из records.py). Запросы не дублируются: SQL и поведение берутся из data.py для обоих
+# бэкендов. Чистые функции (parse_slot_datetime, slots_horizon и т. п.) вызывайте из
+# data напрямую — им пул потоков не нужен.
+#
+# Это не асинхронный драйвер: каждый вызов выполняется в отдельном пуле потоков, чтобы
+# не блокировать цикл событий. Потолок параллельности — config.DB_POOL_MAX_SIZE
+# одновременных вызовов (по размеру пула соединений); остальные ждут свободного потока
+# в очереди пула.
+#
+#     bookings = await data_async.load_user_bookings(user_id)
+
+ASYNC_FUNCTIONS = (
+    'save_user',
+    'load_slots', 'load_bookable_slots', 'add_slots', 'mark_slot_deleted',
+    'save_booking', 'book_slot', 'cancel_booking', 'confirm_booking', 'apply_reminder_responses',
+    'load_user_bookings', 'get_booking', 'load_active_bookings_between',
+    'save_homework', 'load_homeworks_for_user',
+    'load_booking_analytics', 'rebuild_analytics_rollups',
+    'load_slots_page', 'load_past_bookings_for_homework_page', 'load_bookings_overview_page',
+    'archive_past',
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=config.DB_POOL_MAX_SIZE,
+                    thread_name_prefix='db',
+                )
+    return _executor
+
+
+async def run(func, *args, **kwargs):
+    """Выполняет синхронную функцию работы с БД в пуле потоков БД и ждёт результат."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def _async_function(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run(func, *args, **kwargs)
+    return wrapper
+
+
+def _build():
+    for name in ASYNC_FUNCTIONS:
+        globals()[name] = _async_function(getattr(data, name))
+
+
+_build()
+
+
+async def close():
+    """Останавливает пул потоков БД и закрывает соединения (при остановке приложения)."""
+    global _executor
+    await run(data.close_pool)
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
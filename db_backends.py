@@ -0,0 +1,466 @@
+import functools
+import re
+import select
+import sqlite3
+import threading
+import uuid
+import zlib
+from contextlib import contextmanager
+from datetime import date, datetime, time
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+from psycopg2.extras import execute_values
+
+from db_pool import ConnectionPool
+
+# Хранилища данных для data.py.
+#
+# data.py пишет запросы в диалекте PostgreSQL с параметрами %s / %(name)s и работает
+# с соединениями через интерфейс DB-API (cursor/execute/fetch*/commit/rollback).
+# Всё, что между СУБД различается (DDL, блокировки, массовые обновления, построение
+# индексов), вынесено в методы бэкенда. Бэкенд выбирается по DATABASE_URL
+# (см. create_backend).
+
+_PARAM_RE = re.compile(r'%\((\w+)\)s|%s')
+
+
+class PreparingConnection(psycopg2.extensions.connection):
+    """Соединение psycopg2, которое помнит подготовленные на нём запросы."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+
+
+@functools.lru_cache(maxsize=256)
+def _positional_sql(query):
+    """Переводит параметры %s / %(name)s в $1..$n для PREPARE.
+
+    Возвращает (sql, names): names — имена параметров по позициям (None для %s).
+    """
+    names = []
+
+    def replace(match):
+        name = match.group(1)
+        if name is not None and name in names:
+            return f'${names.index(name) + 1}'
+        names.append(name)
+        return f'${len(names)}'
+
+    return _PARAM_RE.sub(replace, query), tuple(names)
+
+
+class PostgresBackend:
+    """PostgreSQL через psycopg2 и пул ConnectionPool."""
+
+    name = 'postgresql'
+    IntegrityError = psycopg2.IntegrityError
+    supports_notify = True  # LISTEN/NOTIFY между процессами бота
+
+    # Ключ pg_advisory_lock для миграций: не даёт двум процессам применять их одновременно
+    MIGRATIONS_LOCK_KEY = 72_010_012
+
+    def __init__(self, dsn, prepare_statements=True, **pool_kwargs):
+        self.prepare_statements = prepare_statements
+        self.pool = ConnectionPool(dsn, connection_factory=PreparingConnection, **pool_kwargs)
+
+    def connection(self):
+        return self.pool.connection()
+
+    def stats(self):
+        return self.pool.stats()
+
+    def close(self):
+        self.pool.closeall()
+
+    def ddl(self, sql):
+        """Приводит DDL к диалекту бэкенда (для PostgreSQL — без изменений)."""
+        return sql
+
+    def execute_prepared(self, cursor, name, query, params=None):
+        """Выполняет частый запрос как серверный подготовленный.
+
+        На каждом соединении запрос готовится (PREPARE) один раз, дальше выполняется
+        по имени (EXECUTE) без повторного разбора и планирования. Имя дополняется
+        контрольной суммой текста, поэтому варианты одного запроса не путаются.
+        При prepare_statements=False — обычный cursor.execute.
+        """
+        if not self.prepare_statements:
+            cursor.execute(query, params)
+            return
+        sql, names = _positional_sql(query)
+        statement = f"{name}_{zlib.crc32(query.encode()):08x}"
+        prepared = cursor.connection.prepared_statements
+        if statement not in prepared:
+            cursor.execute(f'PREPARE {statement} AS {sql}')
+            prepared.add(statement)
+        if isinstance(params, dict):
+            values = [params[param] for param in names]
+        else:
+            values = list(params or ())
+        if values:
+            cursor.execute(f"EXECUTE {statement} ({', '.join(['%s'] * len(values))})", values)
+        else:
+            cursor.execute(f'EXECUTE {statement}')
+
+    def is_undefined_table(self, error):
+        return isinstance(error, psycopg2.errors.UndefinedTable)
+
+    def is_unique_violation(self, error):
+        return isinstance(error, psycopg2.errors.UniqueViolation)
+
+    def date_of(self, column):
+        """SQL-выражение: дата от столбца типа TIMESTAMP."""
+        return f'{column}::date'
+
+    def truncate(self, cursor, tables):
+        cursor.execute(f"TRUNCATE {', '.join(tables)}")
+
+    def add_columns(self, cursor, table, columns):
+        """Добавляет недостающие столбцы [(имя, тип)]."""
+        cursor.execute(f"ALTER TABLE {table} " + ', '.join(
+            f'ADD COLUMN IF NOT EXISTS {name} {sql_type}' for name, sql_type in columns
+        ))
+
+    def bulk_update(self, cursor, table, columns, rows):
+        """UPDATE многих строк по id одним запросом; rows — кортежи (id, значения столбцов...)."""
+        names = ', '.join(name for name, _ in columns)
+        assignments = ', '.join(f'{name} = v.{name}::{sql_type}' for name, sql_type in columns)
+        execute_values(cursor, f'''
+            UPDATE {table} AS t SET {assignments}
+            FROM (VALUES %s) AS v (id, {names})
+            WHERE t.id = v.id
+        ''', rows, page_size=max(len(rows), 1))  # вся пачка — один UPDATE
+
+    def create_indexes(self, conn, indexes, unique=False):
+        kind = 'UNIQUE INDEX' if unique else 'INDEX'
+        # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+        conn.autocommit = True
+        try:
+            cursor = conn.cursor()
+            for name, definition in indexes:
+                # Прерванная сборка оставляет невалидный индекс, который IF NOT EXISTS пропустил бы
+                cursor.execute('SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)', (name,))
+                row = cursor.fetchone()
+                if row is not None and not row[0]:
+                    cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+                cursor.execute(f'CREATE {kind} CONCURRENTLY IF NOT EXISTS {name} ON {definition}')
+        finally:
+            conn.autocommit = False
+
+    def notify(self, cursor, channel, payload):
+        cursor.execute('SELECT pg_notify(%s, %s)', (channel, payload))
+
+    def listen(self, channel, handle, stop_event, poll_interval=5.0):
+        """Слушает уведомления channel на отдельном соединении, пока не установлен stop_event.
+
+        handle(payload) вызывается на каждое уведомление, handle(None) — после каждого
+        (пере)подключения: пока соединения не было, уведомления могли быть пропущены.
+        При обрыве соединение восстанавливается с нарастающей паузой (до 60 с).
+        """
+        delay = 1
+        while not stop_event.is_set():
+            conn = None
+            try:
+                # Отдельное соединение вне пула: оно занято всё время работы бота
+                conn = psycopg2.connect(self.pool.dsn)
+                conn.autocommit = True
+                conn.cursor().execute(f'LISTEN {channel}')
+                handle(None)
+                delay = 1
+                while not stop_event.is_set():
+                    if select.select([conn], [], [], poll_interval) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        handle(conn.notifies.pop(0).payload)
+            except Exception as e:
+                print(f"Подписка на {channel} прервана: {e}. Переподключение через {delay} с")
+                stop_event.wait(delay)
+                delay = min(delay * 2, 60)
+            finally:
+                if conn is not None and not conn.closed:
+                    conn.close()
+
+    def replication_lag(self, conn):
+        """Отставание реплики в секундах (0 для основной БД и догнавшей реплики)."""
+        cursor = conn.cursor()
+        # Если всё полученное уже применено, реплика актуальна, даже когда на основной
+        # БД давно не было записей (pg_last_xact_replay_timestamp тогда старое)
+        cursor.execute('''
+            SELECT CASE
+                WHEN NOT pg_is_in_recovery() THEN 0
+                WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+            END
+        ''')
+        lag = cursor.fetchone()[0]
+        conn.rollback()
+        return float(lag) if lag is not None else None
+
+    def probe_replication_lag(self, connect_timeout):
+        """Отставание по отдельному соединению вне пула: один быстрый отказ вместо повторов пула."""
+        conn = psycopg2.connect(self.pool.dsn, connect_timeout=connect_timeout)
+        try:
+            return self.replication_lag(conn)
+        finally:
+            conn.close()
+
+    @contextmanager
+    def migration_lock(self):
+        # Сессионная блокировка на отдельном соединении вне пула: миграции берут соединения
+        # из пула, и при DB_POOL_MAX_SIZE=1 (или занятом потоками пуле) не дождались бы
+        # соединения, удерживаемого блокировкой. Вне транзакции — чтобы CREATE INDEX
+        # CONCURRENTLY не ждал это соединение
+        conn = psycopg2.connect(self.pool.dsn)
+        try:
+            conn.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute('SELECT pg_advisory_lock(%s)', (self.MIGRATIONS_LOCK_KEY,))
+            try:
+                yield
+            finally:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', (self.MIGRATIONS_LOCK_KEY,))
+        finally:
+            conn.close()
+
+# --- SQLite ---
+
+_FOR_UPDATE_RE = re.compile(r'\s+FOR\s+UPDATE\b', re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=512)
+def _translate(query):
+    """Переводит запрос с параметрами psycopg2 в стиль sqlite3.
+
+    Возвращает (sql, for_update). FOR UPDATE в SQLite нет: вместо блокировки строк
+    курсор открывает транзакцию BEGIN IMMEDIATE (блокировка записи во всю БД).
+    """
+    sql = _PARAM_RE.sub(lambda m: f':{m.group(1)}' if m.group(1) else '?', query)
+    sql, for_update = _FOR_UPDATE_RE.subn('', sql)
+    return sql, bool(for_update)
+
+
+def _register_sqlite_types():
+    """Хранение date/time/datetime/bool в SQLite и обратное преобразование по типу столбца."""
+    sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+    sqlite3.register_adapter(date, lambda value: value.isoformat())
+    sqlite3.register_adapter(time, lambda value: value.isoformat())
+    sqlite3.register_converter('TIMESTAMP', lambda raw: datetime.fromisoformat(raw.decode()))
+    sqlite3.register_converter('DATE', lambda raw: date.fromisoformat(raw.decode()))
+    sqlite3.register_converter('TIME', lambda raw: time.fromisoformat(raw.decode()))
+    sqlite3.register_converter('BOOLEAN', lambda raw: raw not in (b'0', b''))
+
+
+class SQLiteCursor:
+    """Курсор sqlite3 с интерфейсом, которого ожидает data.py."""
+
+    itersize = None  # строки и так читаются с диска по мере перебора
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._cursor = conn.raw.cursor()
+
+    def execute(self, query, params=None):
+        sql, for_update = _translate(query)
+        if for_update and not self._conn.raw.in_transaction:
+            self._cursor.execute('BEGIN IMMEDIATE')
+        self._cursor.execute(sql, self._params(params))
+
+    def executemany(self, query, seq_of_params):
+        sql, _ = _translate(query)
+        self._cursor.executemany(sql, [self._params(params) for params in seq_of_params])
+
+    @staticmethod
+    def _params(params):
+        if params is None:
+            return ()
+        if isinstance(params, dict):
+            return params
+        return tuple(params)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SQLiteConnection:
+    """Обёртка над sqlite3.Connection для пула (атрибут closed, курсор SQLiteCursor)."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.closed = False
+
+    def cursor(self, name=None):
+        return SQLiteCursor(self)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.raw.close()
+        self.closed = True
+
+
+class SQLiteBackend:
+    """Встроенная БД SQLite в режиме WAL: для одного узла и локальной разработки.
+
+    WAL позволяет читать параллельно с записью; пишущие транзакции открываются как
+    BEGIN IMMEDIATE и при занятой БД ждут до busy_timeout. Разобранные запросы
+    кэшируются драйвером на каждом соединении (cached_statements), так что
+    повторяющиеся запросы выполняются как подготовленные.
+    """
+
+    name = 'sqlite'
+    IntegrityError = sqlite3.IntegrityError
+    supports_notify = False  # файл БД обслуживает один процесс — рассылать некому
+
+    PRAGMAS = (
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),  # в WAL надёжно при сбое процесса, fsync только на checkpoint
+        ('foreign_keys', 'ON'),
+        ('temp_store', 'MEMORY'),
+        ('cache_size', '-16384'),  # 16 МБ страничного кэша на соединение
+        ('mmap_size', '268435456'),  # 256 МБ
+    )
+    STATEMENT_CACHE_SIZE = 256
+
+    _types_registered = False
+
+    def __init__(self, path, timeout=30.0, prepare_statements=True, **pool_kwargs):
+        if not SQLiteBackend._types_registered:
+            _register_sqlite_types()
+            SQLiteBackend._types_registered = True
+        self.path = path
+        self.prepare_statements = prepare_statements  # кэш запросов sqlite3 работает всегда
+        self.busy_timeout_ms = int(timeout * 1000)
+        self._uri = path.startswith('file:')
+        if path == ':memory:':
+            # Общая БД в памяти для всех соединений пула (живёт, пока открыто хоть одно)
+            self.path = f'file:bot_memdb_{uuid.uuid4().hex}?mode=memory&cache=shared'
+            self._uri = True
+            pool_kwargs['min_size'] = max(pool_kwargs.get('min_size', 1), 1)
+        self._migration_lock = threading.Lock()
+        self.pool = ConnectionPool(self.path, timeout=timeout, connect_factory=self._connect, **pool_kwargs)
+
+    def _connect(self, path):
+        raw = sqlite3.connect(
+            path,
+            timeout=self.busy_timeout_ms / 1000,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            isolation_level='IMMEDIATE',
+            check_same_thread=False,  # соединение переходит между потоками через пул
+            cached_statements=self.STATEMENT_CACHE_SIZE,
+            uri=self._uri,
+        )
+        for pragma, value in self.PRAGMAS:
+            raw.execute(f'PRAGMA {pragma} = {value}')
+        raw.execute(f'PRAGMA busy_timeout = {self.busy_timeout_ms}')
+        return SQLiteConnection(raw)
+
+    def connection(self):
+        return self.pool.connection()
+
+    def stats(self):
+        return self.pool.stats()
+
+    def close(self):
+        self.pool.closeall()
+
+    def execute_prepared(self, cursor, name, query, params=None):
+        # sqlite3 сам держит подготовленные запросы в кэше соединения (cached_statements)
+        cursor.execute(query, params)
+
+    def ddl(self, sql):
+        sql = sql.replace('SERIAL PRIMARY KEY', 'INTEGER PRIMARY KEY AUTOINCREMENT')
+        # CURRENT_TIMESTAMP в SQLite — время UTC; в PostgreSQL TIMESTAMP хранит локальное
+        return sql.replace('DEFAULT CURRENT_TIMESTAMP', "DEFAULT (datetime('now', 'localtime'))")
+
+    def is_undefined_table(self, error):
+        return isinstance(error, sqlite3.OperationalError) and 'no such table' in str(error)
+
+    def is_unique_violation(self, error):
+        return isinstance(error, sqlite3.IntegrityError) and 'UNIQUE constraint failed' in str(error)
+
+    def date_of(self, column):
+        return f'date({column})'
+
+    def truncate(self, cursor, tables):
+        for table in tables:
+            cursor.execute(f'DELETE FROM {table}')
+
+    def add_columns(self, cursor, table, columns):
+        cursor.execute(f'PRAGMA table_info({table})')
+        existing = {row[1] for row in cursor.fetchall()}
+        for name, sql_type in columns:
+            if name not in existing:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {sql_type}')
+
+    def bulk_update(self, cursor, table, columns, rows):
+        assignments = ', '.join(f'{name} = %s' for name, _ in columns)
+        cursor.executemany(
+            f'UPDATE {table} SET {assignments} WHERE id = %s',
+            [tuple(row[1:]) + (row[0],) for row in rows]
+        )
+
+    def create_indexes(self, conn, indexes, unique=False):
+        kind = 'UNIQUE INDEX' if unique else 'INDEX'
+        cursor = conn.cursor()
+        for name, definition in indexes:
+            cursor.execute(f'CREATE {kind} IF NOT EXISTS {name} ON {definition}')
+        conn.commit()
+
+    def notify(self, cursor, channel, payload):
+        pass
+
+    def replication_lag(self, conn):
+        # Файл SQLite не реплицируется: «реплика» — тот же или скопированный файл
+        return 0.0
+
+    def probe_replication_lag(self, connect_timeout):
+        return 0.0
+
+    @contextmanager
+    def migration_lock(self):
+        # Файл БД обслуживает один процесс бота — достаточно блокировки внутри процесса
+        with self._migration_lock:
+            yield
+
+
+def create_backend(database_url, **pool_kwargs):
+    """Создаёт бэкенд по DATABASE_URL: sqlite:///путь/к/файлу.db или строка подключения PostgreSQL."""
+    if database_url.startswith('sqlite:'):
+        path = database_url[len('sqlite:'):]
+        if path.startswith('///'):
+            path = path[3:]  # sqlite:///bot.db -> bot.db, sqlite:////abs/bot.db -> /abs/bot.db
+        elif path.startswith('//'):
+            path = path[2:]
+        return SQLiteBackend(path or ':memory:', **pool_kwargs)
+    return PostgresBackend(database_url, **pool_kwargs)
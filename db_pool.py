@@ -0,0 +1,194 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+
+
+class PoolTimeoutError(Exception):
+    """Не удалось получить соединение из пула за отведённое время."""
+
+
+class ConnectionPool:
+    """Ограниченный потокобезопасный пул соединений с PostgreSQL.
+
+    Держит не меньше min_size и не больше max_size соединений. Если все
+    соединения заняты, поток ждёт освобождения не дольше timeout секунд.
+    Простаивавшие дольше health_check_interval соединения перед выдачей
+    проверяются запросом SELECT 1, «мёртвые» соединения пересоздаются.
+    connect_factory (по умолчанию psycopg2.connect) позволяет держать в пуле
+    соединения другого драйвера с тем же интерфейсом (см. db_backends.py).
+    """
+
+    def __init__(self, dsn, min_size=1, max_size=10, timeout=30.0,
+                 health_check_interval=60.0, connect_retries=3, connect_factory=None, **connect_kwargs):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Некорректные размеры пула: min_size=%s, max_size=%s" % (min_size, max_size))
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.connect_retries = connect_retries
+        self.connect_kwargs = connect_kwargs
+        self.connect_factory = connect_factory or psycopg2.connect
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle = deque()  # (conn, время возврата в пул)
+        self._size = 0  # открытые соединения, включая создаваемые прямо сейчас
+        self._closed = False
+
+        self._stats = {
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'timeouts': 0,
+            'health_check_failures': 0,
+            'reconnects': 0,
+        }
+
+        for _ in range(min_size):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        """Открывает новое соединение, повторяя попытку при сетевых ошибках."""
+        delay = 0.5
+        for attempt in range(1, self.connect_retries + 1):
+            try:
+                conn = self.connect_factory(self.dsn, **self.connect_kwargs)
+                with self._lock:
+                    self._stats['created'] += 1
+                return conn
+            except psycopg2.OperationalError as e:
+                if attempt == self.connect_retries:
+                    raise
+                print(f"Не удалось подключиться к БД (попытка {attempt}): {e}")
+                time.sleep(delay)
+                delay *= 2
+
+    def _close_conn(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._stats['closed'] += 1
+
+    def _is_healthy(self, conn, idle_since):
+        """Проверяет, что соединение живое."""
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    def getconn(self):
+        """Берёт соединение из пула (или создаёт новое, если есть запас)."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise psycopg2.InterfaceError("Пул соединений закрыт")
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    conn, idle_since = None, None
+                    self._size += 1  # резервируем место под новое соединение
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f"Нет свободных соединений в пуле за {self.timeout} с "
+                        f"(занято {self._size} из {self.max_size})"
+                    )
+                waited = True
+                self._available.wait(remaining)
+
+            self._stats['checkouts'] += 1
+            if waited:
+                self._stats['waits'] += 1
+                self._stats['wait_time_total'] += time.monotonic() - started
+
+        if conn is not None and not self._is_healthy(conn, idle_since):
+            with self._lock:
+                self._stats['health_check_failures'] += 1
+                self._stats['reconnects'] += 1
+                self._close_conn(conn)
+            conn = None
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._lock:
+                    self._size -= 1
+                    self._available.notify()
+                raise
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """Возвращает соединение в пул; сломанные соединения закрываются."""
+        if not discard and not conn.closed:
+            try:
+                # Незавершённая транзакция не должна «утечь» к следующему вызывающему
+                conn.rollback()
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                discard = True
+
+        with self._lock:
+            if discard or conn.closed or self._closed:
+                self._close_conn(conn)
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._available.notify()
+
+    @contextmanager
+    def connection(self):
+        """Контекстный менеджер: выдаёт соединение и гарантированно возвращает его."""
+        conn = self.getconn()
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # Соединение могло оборваться — не возвращаем его в пул
+            discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def stats(self):
+        """Возвращает снимок статистики использования пула."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._size - stats['idle']
+            stats['min_size'] = self.min_size
+            stats['max_size'] = self.max_size
+        stats['avg_wait_ms'] = (stats['wait_time_total'] / stats['waits'] * 1000) if stats['waits'] else 0.0
+        return stats
+
+    def closeall(self):
+        """Закрывает все простаивающие соединения и запрещает выдачу новых."""
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._close_conn(conn)
+                self._size -= 1
+            self._available.notify_all()
@@ -0,0 +1,152 @@
+import threading
+import time
+from collections import deque
+
+import telebot
+
+
+class ChatDispatcher:
+    """Пул потоков: задачи разных чатов выполняются параллельно, одного чата — строго по порядку.
+
+    У каждого чата своя очередь, и в каждый момент её обрабатывает не больше одного потока,
+    поэтому цепочки register_next_step_handler видят сообщения в порядке поступления, а
+    долгий обработчик задерживает только свой чат. Чаты с несколькими задачами
+    обслуживаются по кругу: после каждой задачи чат встаёт в конец очереди готовых.
+    """
+
+    def __init__(self, num_workers=8, name='dispatch'):
+        self.num_workers = num_workers
+        self._cond = threading.Condition()
+        self._chats = {}  # ключ чата -> deque((время постановки, задача))
+        self._ready = deque()  # чаты с задачами, которые сейчас никто не обрабатывает
+        self._running = set()
+        self._pending = 0
+        self._stopping = False
+        self._stats = {
+            'submitted': 0, 'completed': 0, 'failed': 0,
+            'max_queue_depth': 0, 'wait_time_total': 0.0, 'max_wait_ms': 0.0,
+        }
+        self._workers = [
+            threading.Thread(target=self._work, name=f'{name}-{i}', daemon=True)
+            for i in range(num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, key, task):
+        """Ставит задачу task() в очередь чата key."""
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("Диспетчер остановлен")
+            queue = self._chats.get(key)
+            if queue is None:
+                queue = self._chats[key] = deque()
+            queue.append((time.monotonic(), task))
+            self._pending += 1
+            self._stats['submitted'] += 1
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], self._pending)
+            if len(queue) == 1 and key not in self._running:
+                self._ready.append(key)
+                self._cond.notify()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._ready and not self._stopping:
+                    self._cond.wait()
+                if not self._ready:
+                    return  # остановка, и все очереди разобраны
+                key = self._ready.popleft()
+                enqueued_at, task = self._chats[key].popleft()
+                self._running.add(key)
+                self._pending -= 1
+                wait = time.monotonic() - enqueued_at
+                self._stats['wait_time_total'] += wait
+                self._stats['max_wait_ms'] = max(self._stats['max_wait_ms'], wait * 1000)
+
+            failed = False
+            try:
+                task()
+            except Exception as e:
+                failed = True
+                print(f"Ошибка при обработке обновления (чат {key}): {e}")
+
+            with self._cond:
+                self._stats['completed'] += 1
+                self._stats['failed'] += failed
+                self._running.discard(key)
+                if self._chats[key]:
+                    self._ready.append(key)
+                    self._cond.notify()
+                else:
+                    del self._chats[key]
+
+    def stop(self, timeout=30.0):
+        """Дожидается обработки уже поставленных задач и останавливает потоки."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(max(deadline - time.monotonic(), 0))
+
+    def stats(self):
+        """Глубина очереди, занятость потоков и время ожидания задач в очереди."""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['queue_depth'] = self._pending
+            stats['chats_waiting'] = len(self._chats) - len(self._running)
+            stats['busy_workers'] = len(self._running)
+        stats['workers'] = self.num_workers
+        started = stats['completed'] + stats['busy_workers']
+        stats['avg_wait_ms'] = stats.pop('wait_time_total') / started * 1000 if started else 0.0
+        return stats
+
+
+def chat_key(update):
+    """Ключ очереди для обновления: ID чата (или пользователя), иначе само обновление."""
+    for attr in ('message', 'edited_message', 'channel_post', 'edited_channel_post'):
+        message = getattr(update, attr, None)
+        if message is not None:
+            return message.chat.id
+    callback = getattr(update, 'callback_query', None)
+    if callback is not None:
+        # Нажатия в чате идут в одну очередь с его сообщениями
+        return callback.message.chat.id if callback.message is not None else callback.from_user.id
+    for attr in ('inline_query', 'chosen_inline_result', 'shipping_query', 'pre_checkout_query',
+                 'poll_answer', 'my_chat_member', 'chat_member', 'chat_join_request'):
+        event = getattr(update, attr, None)
+        if event is None:
+            continue
+        chat = getattr(event, 'chat', None)
+        if chat is not None:
+            return chat.id
+        user = getattr(event, 'from_user', None) or getattr(event, 'user', None)
+        if user is not None:
+            return user.id
+    return ('update', update.update_id)  # без чата порядок не важен
+
+
+class DispatchingTeleBot(telebot.TeleBot):
+    """TeleBot, передающий обновления в ChatDispatcher (и при polling, и при webhook).
+
+    Сам бот работает в режиме threaded=False: обработчики одного обновления выполняются
+    синхронно в потоке диспетчера, а параллельность и порядок обеспечивает диспетчер.
+    """
+
+    def __init__(self, token, num_workers=8, **kwargs):
+        super().__init__(token, threaded=False, **kwargs)
+        self.dispatcher = ChatDispatcher(num_workers)
+        self._offset_lock = threading.Lock()  # webhook вызывает process_new_updates из разных потоков
+
+    def process_new_updates(self, updates):
+        for update in updates:
+            # Смещение двигаем сразу, до обработки: следующий getUpdates не должен вернуть
+            # уже поставленные в очередь обновления. Потоки диспетчера его тогда не меняют —
+            # в TeleBot.process_new_updates last_update_id уже не меньше update_id.
+            with self._offset_lock:
+                self.last_update_id = max(self.last_update_id, update.update_id)
+            self.dispatcher.submit(
+                chat_key(update),
+                lambda update=update: telebot.TeleBot.process_new_updates(self, [update]),
+            )
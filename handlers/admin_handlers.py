@@ -1,9 +1,27 @@
 import telebot
 import data
-from datetime import datetime, timedelta
+from datetime import datetime
 
 # В admin_handlers.py
 
+# Размеры страниц админских списков (помещаются в одно сообщение / клавиатуру)
+BOOKINGS_PAGE_SIZE = 10
+SLOTS_PAGE_SIZE = 40
+HW_BOOKINGS_PAGE_SIZE = 10
+
+# Сколько самых затратных функций БД показывать в /db_stats
+DB_STATS_TOP = 15
+QUERY_BUCKET_MAX_MS = data.QueryStats.BUCKETS_MS[-1]
+
+# Тексты статусов для обзора записей (статус вычисляет data.load_bookings_overview_page)
+OVERVIEW_STATUS_TEXTS = {
+    data.OVERVIEW_STATUS_CANCELLED_BY_USER: "🚫 Отменена пользователем (слот освобожден)",
+    data.OVERVIEW_STATUS_CANCELLED_BY_ADMIN: "🚫 Отменена администратором",
+    data.OVERVIEW_STATUS_SLOT_DELETED: "🚫 Слот удален администратором",
+    data.OVERVIEW_STATUS_CONFIRMED: "✅ Подтверждена",
+    data.OVERVIEW_STATUS_PENDING: "⏰ Ожидает подтверждения",
+}
+
 def get_chat_and_message_id_from_call_or_msg(call=None, message=None):
     """Возвращает chat_id и message_id из callback или message"""
     if call:
@@ -38,6 +56,16 @@ def register_admin_handlers(bot, admin_ids_list):
     def is_admin(user_id):
         """Проверяет, является ли пользователь администратором"""
         return str(user_id) in admin_ids
+
+    def add_page_buttons(markup, page_prefix, cursor, next_cursor):
+        """Добавляет кнопки листания для keyset-страницы"""
+        buttons = []
+        if cursor:
+            buttons.append(telebot.types.InlineKeyboardButton("⏮ В начало", callback_data=page_prefix))
+        if next_cursor:
+            buttons.append(telebot.types.InlineKeyboardButton("➡️ Далее", callback_data=f"{page_prefix}{next_cursor}"))
+        if buttons:
+            markup.row(*buttons)
     
     def send_or_edit_message(chat_id, message_id, text, reply_markup=None):
         """Отправляет или редактирует сообщение в зависимости от доступности message_id"""
@@ -71,6 +99,45 @@ def register_admin_handlers(bot, admin_ids_list):
         else:
             bot.send_message(message.chat.id, "У вас нет доступа к админской помощи.")
     
+    @bot.message_handler(commands=['db_stats'])
+    def admin_db_stats(message):
+        """Админ: время обращений к БД по функциям data.py (с запуска бота)"""
+        if not is_admin(message.from_user.id):
+            bot.send_message(message.chat.id, "У вас нет доступа к статистике.")
+            return
+
+        stats = data.get_query_stats()
+        if not stats:
+            bot.send_message(message.chat.id, "Обращений к БД пока не было.")
+            return
+
+        response = "📈 Обращения к БД (по суммарному времени):\n\n"
+        for entry in stats[:DB_STATS_TOP]:
+            response += f"{entry['name']}: {entry['calls']} выз."
+            if entry['errors']:
+                response += f", ошибок {entry['errors']}"
+            p95 = f"≤ {entry['p95_ms']}" if entry['p95_ms'] != float('inf') else f"> {QUERY_BUCKET_MAX_MS}"
+            response += (f"\n  ср. {entry['avg_ms']:.1f} мс, p95 {p95} мс, макс {entry['max_ms']:.0f} мс"
+                         f"\n  строк {entry['avg_rows']:.1f}, ожидание соединения {entry['avg_wait_ms']:.1f} мс")
+            if entry['slow']:
+                response += f", медленных {entry['slow']}"
+            response += "\n"
+
+        pool = data.get_pool_stats()
+        if pool:
+            response += (f"\n🔌 Пул: занято {pool['in_use']}/{pool['max_size']}, ожиданий {pool['waits']}, "
+                         f"тайм-аутов {pool['timeouts']}, ср. ожидание {pool['avg_wait_ms']:.1f} мс")
+        cache = data.get_cache_stats()
+        response += f"\n🗂 Кэш слотов: попаданий {cache.get('hits', 0)}, промахов {cache.get('misses', 0)}"
+        dispatcher = getattr(bot, 'dispatcher', None)
+        if dispatcher is not None:
+            dispatch = dispatcher.stats()
+            response += (f"\n🧵 Обновления: в очереди {dispatch['queue_depth']} (макс. {dispatch['max_queue_depth']}), "
+                         f"занято потоков {dispatch['busy_workers']}/{dispatch['workers']}, "
+                         f"ожидание ср. {dispatch['avg_wait_ms']:.0f} мс, макс. {dispatch['max_wait_ms']:.0f} мс")
+
+        bot.send_message(message.chat.id, response)
+
     def admin_help(message):
         """Помощь для администраторов"""
         if is_admin(message.from_user.id):
@@ -79,6 +146,7 @@ def register_admin_handlers(bot, admin_ids_list):
 
 /admin - Вход в админскую панель
 /admin_help - Помощь по командам админа
+/db_stats - Время обращений к БД и очередь обновлений
 
 📅 Управление слотами:
 - Добавление слотов: указать дату и временной диапазон
@@ -191,8 +259,7 @@ def register_admin_handlers(bot, admin_ids_list):
             comment = message.caption if message.caption else ""
 
             # Загружаем данные записи, чтобы получить user_id
-            all_bookings = data.load_bookings()
-            booking = next((b for b in all_bookings if b['id'] == booking_id), None)
+            booking = data.get_booking(booking_id)
             if not booking:
                 bot.reply_to(message, "Ошибка: запись не найдена.")
                 return
@@ -235,8 +302,7 @@ def register_admin_handlers(bot, admin_ids_list):
         try:
             booking_id = int(call.data.split('_')[2])
             # Проверим, что запись существует
-            all_bookings = data.load_bookings()
-            booking = next((b for b in all_bookings if b['id'] == booking_id), None)
+            booking = data.get_booking(booking_id)
             if not booking:
                 bot.answer_callback_query(call.id, "Запись не найдена.")
                 return
@@ -261,11 +327,11 @@ def register_admin_handlers(bot, admin_ids_list):
             traceback.print_exc()
             bot.answer_callback_query(call.id, "Ошибка при обработке выбора")
 
-    def admin_select_booking_for_hw_call(call):
-        """Показывает список прошедших записей для отправки ДЗ."""
+    def admin_select_booking_for_hw_call(call, cursor=None):
+        """Показывает страницу прошедших записей для отправки ДЗ."""
         print(f"admin_select_booking_for_hw_call вызвана для администратора: {call.from_user.id}")
         try:
-            bookings = data.load_past_bookings_for_homework()
+            bookings, next_cursor = data.load_past_bookings_for_homework_page(HW_BOOKINGS_PAGE_SIZE, cursor)
             if not bookings:
                 send_or_edit_message(
                     call.message.chat.id,
@@ -282,6 +348,7 @@ def register_admin_handlers(bot, admin_ids_list):
                 callback_data = f"hw_select_{booking['id']}"
                 markup.add(telebot.types.InlineKeyboardButton(button_text, callback_data=callback_data))
 
+            add_page_buttons(markup, "admin_hw_page_", cursor, next_cursor)
             markup.add(telebot.types.InlineKeyboardButton("🔙 Назад", callback_data="admin_back"))
 
             send_or_edit_message(
@@ -362,6 +429,16 @@ def register_admin_handlers(bot, admin_ids_list):
                 show_admin_menu(call.message)
             elif call.data == 'admin_send_hw': # <-- Новый elif
                 admin_select_booking_for_hw_call(call)
+            elif call.data.startswith('admin_bookings_page_'):
+                admin_view_bookings(call.message, cursor=call.data[len('admin_bookings_page_'):])
+            elif call.data.startswith('admin_archive_page_'):
+                admin_view_bookings(call.message, cursor=call.data[len('admin_archive_page_'):], archived=True)
+            elif call.data.startswith('admin_slots_page_'):
+                admin_view_slots(call.message, cursor=call.data[len('admin_slots_page_'):])
+            elif call.data.startswith('admin_delslots_page_'):
+                admin_delete_slots(call.message, cursor=call.data[len('admin_delslots_page_'):])
+            elif call.data.startswith('admin_hw_page_'):
+                admin_select_booking_for_hw_call(call, cursor=call.data[len('admin_hw_page_'):])
                 
             bot.answer_callback_query(call.id)
         except Exception as e:
@@ -381,29 +458,14 @@ def register_admin_handlers(bot, admin_ids_list):
             datetime.strptime(end_time, "%H:%M")
             
             # Разбиваем на часовые слоты
-            slots = data.load_slots()
             date = bot.user_data[message.from_user.id]['admin_date']
             
-            if date not in slots:
-                slots[date] = []
-            
             start_hour = int(start_time.split(':')[0])
             end_hour = int(end_time.split(':')[0])
             
-            added_slots = []
-            for hour in range(start_hour, end_hour):
-                slot_time = f"{hour:02d}:00-{hour+1:02d}:00"
-                # Проверяем, что слот еще не существует
-                slot_exists = any(slot['time'] == slot_time for slot in slots[date])
-                
-                if not slot_exists:
-                    slots[date].append({
-                        'time': slot_time,
-                        'available': True
-                    })
-                    added_slots.append(slot_time)
-            
-            data.save_slots(slots)
+            slot_times = [f"{hour:02d}:00-{hour+1:02d}:00" for hour in range(start_hour, end_hour)]
+            # Уже существующие слоты пропускаются на стороне БД
+            added_slots = data.add_slots(date, slot_times)
             
             if added_slots:
                 response = f"✅ Слоты добавлены на {date}:\n" + "\n".join(added_slots)
@@ -426,54 +488,40 @@ def register_admin_handlers(bot, admin_ids_list):
             bot.register_next_step_handler(msg, process_admin_time_input)
     
     @bot.message_handler(func=lambda message: message.text == "📋 Просмотр слотов" and is_admin(message.from_user.id))
-    def admin_view_slots(message):
-        """Админ: просмотр слотов"""
-        slots = data.load_slots()
+    def admin_view_slots(message, cursor=None):
+        """Админ: просмотр слотов (постранично)"""
+        # Только даты горизонта записи, в хронологическом порядке — фильтр и сортировка в БД.
+        # Список открывают сразу после добавления слотов, поэтому читаем с основной БД
+        from_date, to_date = data.slots_horizon()
+        slots, next_cursor = data.load_slots_page(SLOTS_PAGE_SIZE, cursor, status='active',
+                                                  from_date=from_date, to_date=to_date, replica=False)
+        
+        response = f"📅 Слоты на ближайшие {(to_date - from_date).days} дн.:\n"
+        current_date = None
+        for slot in slots:
+            if slot['date'] != current_date:
+                current_date = slot['date']
+                response += f"\n📅 {current_date}:\n"
+            status = "✅ Свободен" if slot.get('available', True) else "❌ Занят"
+            response += f"  {slot['time']} - {status}\n"
         
         if not slots:
-            markup = telebot.types.InlineKeyboardMarkup()
-            markup.add(telebot.types.InlineKeyboardButton("🔙 Назад", callback_data="admin_back"))
-            
-            bot.send_message(message.chat.id, "Нет созданных слотов.", reply_markup=markup)
-            return
-        
-        from datetime import date
-        today = date.today()
-        
-        response = "📅 Доступные слоты:\n\n"
-        has_future_slots = False
-        
-        sorted_dates = []
-        for date_str in slots.keys():
-            try:
-                slot_date = datetime.strptime(date_str, "%d.%m.%Y").date()
-                sorted_dates.append((date_str, slot_date))
-            except ValueError:
-                continue
-        
-        sorted_dates.sort(key=lambda x: x[1])
-        
-        for date_str, slot_date in sorted_dates:
-            if slot_date >= today:
-                has_future_slots = True
-                response += f"📅 {date_str}:\n"
-                for slot in slots[date_str]:
-                    status = "✅ Свободен" if slot.get('available', True) else "❌ Занят"
-                    response += f"  {slot['time']} - {status}\n"
-                response += "\n"
-        
-        if not has_future_slots:
             response = "Нет слотов на будущие даты."
         
         markup = telebot.types.InlineKeyboardMarkup()
+        add_page_buttons(markup, "admin_slots_page_", cursor, next_cursor)
         markup.add(telebot.types.InlineKeyboardButton("🔙 Назад", callback_data="admin_back"))
         
         bot.send_message(message.chat.id, response, reply_markup=markup)
     
     @bot.message_handler(func=lambda message: message.text == "🗑️ Удалить слоты" and is_admin(message.from_user.id))
-    def admin_delete_slots(message):
-        """Админ: удаление слотов"""
-        slots = data.load_slots()
+    def admin_delete_slots(message, cursor=None):
+        """Админ: удаление слотов (постранично)"""
+        # Удалённые админом слоты не показываем — отсекаем их в запросе. Список обновляется
+        # сразу после удаления, поэтому читаем с основной БД, а не с отстающей реплики
+        from_date, to_date = data.slots_horizon()
+        slots, next_cursor = data.load_slots_page(SLOTS_PAGE_SIZE, cursor, status='active',
+                                                  from_date=from_date, to_date=to_date, replica=False)
         
         if not slots:
             markup = telebot.types.InlineKeyboardMarkup()
@@ -487,44 +535,19 @@ def register_admin_handlers(bot, admin_ids_list):
             )
             return
         
-        from datetime import date
-        today = date.today()
-        
         markup = telebot.types.InlineKeyboardMarkup()
         
-        sorted_dates = []
-        for date_str in slots.keys():
-            try:
-                slot_date = datetime.strptime(date_str, "%d.%m.%Y").date()
-                if slot_date >= today:
-                    sorted_dates.append((date_str, slot_date))
-            except ValueError:
-                continue
-        
-        sorted_dates.sort(key=lambda x: x[1])
-        
-        has_future_slots = False
-        for date_str, slot_date in sorted_dates:
-            date_slots = slots[date_str]
-            markup.add(telebot.types.InlineKeyboardButton(f"📅 {date_str}", callback_data=f"date_header_{date_str}"))
-            
-            for i, slot in enumerate(date_slots):
-                # Показываем только слоты, которые ещё не были удалены админом
-                if not slot.get('deleted_by_admin', False):
-                    # Показываем и занятые тоже
-                    slot_text = f"{slot['time']} - {'✅' if slot.get('available', True) else '❌'}"
-                    callback_data = f"delete_slot_{date_str}_{i}"
-                    markup.add(telebot.types.InlineKeyboardButton(slot_text, callback_data=callback_data))
-                    has_future_slots = True
-        
-        if not has_future_slots:
-            send_or_edit_message(
-                message.chat.id,
-                getattr(message, 'message_id', None),
-                "Нет доступных слотов для удаления (все слоты на будущие даты уже удалены)."
-            )
-            return
-        
+        current_date = None
+        for slot in slots:
+            if slot['date'] != current_date:
+                current_date = slot['date']
+                markup.add(telebot.types.InlineKeyboardButton(f"📅 {current_date}", callback_data=f"date_header_{current_date}"))
+            # Показываем и занятые тоже
+            slot_text = f"{slot['time']} - {'✅' if slot.get('available', True) else '❌'}"
+            callback_data = f"delete_slot_{slot['id']}"
+            markup.add(telebot.types.InlineKeyboardButton(slot_text, callback_data=callback_data))
+        
+        add_page_buttons(markup, "admin_delslots_page_", cursor, next_cursor)
         markup.add(telebot.types.InlineKeyboardButton("🔙 Назад", callback_data="admin_back"))
         
         send_or_edit_message(
@@ -550,47 +573,21 @@ def register_admin_handlers(bot, admin_ids_list):
                 return
             
             if call.data.startswith('delete_slot_'):
-                # Разбираем данные слота
-                parts = call.data.split('_', 2)
-                if len(parts) < 3:
-                    bot.answer_callback_query(call.id, "Ошибка: некорректные данные")
-                    return
-
-                date_slot_part = parts[2]
                 try:
-                    date, slot_index_str = date_slot_part.rsplit('_', 1)
-                    slot_index = int(slot_index_str)
-                except (ValueError, IndexError):
+                    slot_id = int(call.data[len('delete_slot_'):])
+                except ValueError:
                     bot.answer_callback_query(call.id, "Ошибка: некорректные данные")
                     return
                 
-                # Загружаем слоты
-                slots = data.load_slots()
-                print(f"Available slots: {slots}")  # Отладка
+                # Помечаем слот удалённым и отменяем записи на него одной транзакцией
+                result = data.mark_slot_deleted(slot_id)
                 
-                if date in slots and 0 <= slot_index < len(slots[date]):
-                    deleted_slot = slots[date][slot_index]
+                if result:
+                    deleted_slot, affected_users = result
+                    date = deleted_slot['date']
                     slot_time = deleted_slot['time']
                     print(f"Deleting slot: {date} {slot_time}")  # Отладка
                     
-                    # Отмечаем слот как удаленный админом (независимо от статуса)
-                    slots[date][slot_index]['available'] = False
-                    slots[date][slot_index]['deleted_by_admin'] = True
-                    
-                    # Помечаем все записи на этот слот как отмененные админом
-                    bookings = data.load_bookings()
-                    affected_users = []
-                    for booking in bookings:
-                        if (booking['date'] == date and 
-                            booking['time'] == slot_time and 
-                            not booking.get('cancelled_by_user', False) and 
-                            not booking.get('cancelled_by_admin', False)):  # Только если не отменено пользователем или админом
-                            booking['cancelled_by_admin'] = True
-                            affected_users.append(booking['user_id'])
-                    
-                    data.save_bookings(bookings)
-                    data.save_slots(slots)
-                    
                     # Отправляем уведомление всем затронутым пользователям
                     for user_id in affected_users:
                         try:
@@ -615,7 +612,7 @@ def register_admin_handlers(bot, admin_ids_list):
                     show_admin_menu(call.message)
                 else:
                     bot.answer_callback_query(call.id, "Ошибка: слот не найден")
-                    print(f"Slot not found: {date} index {slot_index}")  # Отладка
+                    print(f"Slot not found: id {slot_id}")  # Отладка
             else:
                 bot.answer_callback_query(call.id, "Неизвестная команда")
                 print(f"Unknown delete command: {call.data}")  # Отладка
@@ -627,60 +624,34 @@ def register_admin_handlers(bot, admin_ids_list):
             bot.answer_callback_query(call.id, f"Ошибка: {str(e)}")
         
     @bot.message_handler(func=lambda message: message.text == "👥 Просмотр записей" and is_admin(message.from_user.id))
-    def admin_view_bookings(message):
-        """Админ: просмотр записей"""
+    def admin_view_bookings(message, cursor=None, archived=False):
+        """Админ: просмотр записей (постранично); archived=True — история из архива"""
         print(f"admin_view_bookings вызвана для администратора: {message.from_user.id}") # <-- Добавь это
-        bookings = data.load_bookings() # <-- Это место может "зависнуть", если БД занята или повреждена
+        # Только показываемая страница: записи, слоты и родители — одним запросом
+        bookings, next_cursor = data.load_bookings_overview_page(BOOKINGS_PAGE_SIZE, cursor, archived=archived)
 
         if not bookings:
             markup = telebot.types.InlineKeyboardMarkup()
+            if not archived:
+                markup.add(telebot.types.InlineKeyboardButton("🗄 Архив записей", callback_data="admin_archive_page_"))
             markup.add(telebot.types.InlineKeyboardButton("🔙 Назад", callback_data="admin_back"))
 
             send_or_edit_message(
                 message.chat.id,
                 getattr(message, 'message_id', None), # <-- Используем getattr
-                "Нет записей.",
+                "Архив пуст." if archived else "Нет записей.",
                 reply_markup=markup
             )
             print(f"admin_view_bookings завершена (нет записей) для администратора: {message.from_user.id}") # <-- Добавь это
             return
 
-        response = "👥 Записи на занятия:\n\n"
+        response = "🗄 Архив записей (прошедшие занятия):\n\n" if archived else "👥 Записи на занятия:\n\n"
         for booking in bookings:
-            # Определяем статус записи
-            status = ""
-            if booking.get('cancelled_by_user', False):
-                status = "🚫 Отменена пользователем (слот освобожден)"
-            elif booking.get('cancelled_by_admin', False):
-                status = "🚫 Отменена администратором"
-            else:
-                # Проверяем, доступен ли еще слот
-                slots = data.load_slots() # <-- Это место тоже может "зависнуть"
-                slot_available = False
-                slot_exists = False
-                slot_deleted_by_admin = False
-
-                if booking['date'] in slots:
-                    for slot in slots[booking['date']]:
-                        if slot['time'] == booking['time']:
-                            slot_exists = True
-                            slot_available = slot.get('available', True)
-                            slot_deleted_by_admin = slot.get('deleted_by_admin', False)
-                            break
-
-                if not slot_exists or slot_deleted_by_admin:
-                    status = "🚫 Слот удален администратором"
-                elif not slot_available:
-                    status = "✅ Подтверждена"
-                else:
-                    status = "⏰ Ожидает подтверждения"
-
-            # parent_name теперь в users, а не в booking
-            users_data = data.load_users() # <-- Это тоже может "зависнуть"
-            parent_name = users_data.get(str(booking['user_id']), {}).get('parent_name', 'N/A')
+            status = OVERVIEW_STATUS_TEXTS[booking['overview_status']]
+            parent_name = booking['parent_name'] or 'N/A'
 
             response += f"📅 {booking['date']} {booking['time']}\n"
-            response += f"👨 Родитель: {parent_name}\n" # <-- Вот тут была ошибка
+            response += f"👨 Родитель: {parent_name}\n"
             response += f"👶 Ребенок: {booking['child_name']}\n"
             response += f"📞 Телефон: {booking['phone']}\n"
             response += f"🆔 ID пользователя: {booking['user_id']}\n"
@@ -688,6 +659,11 @@ def register_admin_handlers(bot, admin_ids_list):
             response += "➖➖➖➖➖\n"
 
         markup = telebot.types.InlineKeyboardMarkup()
+        add_page_buttons(markup, "admin_archive_page_" if archived else "admin_bookings_page_", cursor, next_cursor)
+        if archived:
+            markup.add(telebot.types.InlineKeyboardButton("👥 Текущие записи", callback_data="admin_bookings_page_"))
+        else:
+            markup.add(telebot.types.InlineKeyboardButton("🗄 Архив записей", callback_data="admin_archive_page_"))
         markup.add(telebot.types.InlineKeyboardButton("🔙 Назад", callback_data="admin_back"))
 
         send_or_edit_message(
@@ -744,62 +720,23 @@ def register_admin_handlers(bot, admin_ids_list):
     @bot.message_handler(func=lambda message: message.text == "📊 Аналитика" and is_admin(message.from_user.id))
     def admin_analytics(message):
         """Админ: аналитика"""
-        bookings = data.load_bookings()
-        
-        if not bookings:
+        # Все подсчёты выполняются в БД, сюда приходят только итоговые числа
+        stats = data.load_booking_analytics()
+
+        if not stats['all']:
             bot.send_message(message.chat.id, "Нет данных для аналитики.", reply_markup=telebot.types.ReplyKeyboardRemove())
             show_admin_menu(message)
             return
-        
-        total_bookings = len([b for b in bookings if not b.get('cancelled_by_user', False)])
-        cancelled_bookings = len([b for b in bookings if b.get('cancelled_by_user', False)])
-        confirmed_bookings = len([b for b in bookings if b.get('confirmed', False) and not b.get('cancelled_by_user', False)])
-        unconfirmed_bookings = total_bookings - confirmed_bookings
-        
-        now = datetime.now()
-        week_ago = now - timedelta(days=7)
-        month_ago = now - timedelta(days=30)
-        year_ago = now - timedelta(days=365)
-        
-        week_count = 0
-        month_count = 0
-        year_count = 0
-        
-        for booking in bookings:
-            if booking.get('cancelled_by_user', False):
-                continue
-            try:
-                timestamp_str = booking['timestamp']
-                if timestamp_str.endswith('Z'):
-                    booking_datetime = datetime.fromisoformat(timestamp_str[:-1])
-                else:
-                    booking_datetime = datetime.fromisoformat(timestamp_str)
-                
-                if booking_datetime > week_ago:
-                    week_count += 1
-                if booking_datetime > month_ago:
-                    month_count += 1
-                if booking_datetime > year_ago:
-                    year_count += 1
-            except Exception:
-                continue
-        
-        children_count = {}
-        for booking in bookings:
-            if booking.get('cancelled_by_user', False):
-                continue
-            child_name = booking['child_name']
-            children_count[child_name] = children_count.get(child_name, 0) + 1
-        
-        top_children = sorted(children_count.items(), key=lambda x: x[1], reverse=True)[:5]
-        
-        user_cancellations = {}
-        for booking in bookings:
-            if 'cancelled_by_user' in booking and booking['cancelled_by_user']:
-                user_id = booking['user_id']
-                user_cancellations[user_id] = user_cancellations.get(user_id, 0) + 1
-        
-        top_cancelling_users = sorted(user_cancellations.items(), key=lambda x: x[1], reverse=True)[:5]
+
+        total_bookings = stats['total']
+        confirmed_bookings = stats['confirmed']
+        unconfirmed_bookings = stats['unconfirmed']
+        cancelled_bookings = stats['cancelled']
+        week_count = stats['week']
+        month_count = stats['month']
+        year_count = stats['year']
+        top_children = stats['top_children']
+        top_cancelling_users = stats['top_cancelling_users']
         
         report = "📊 Аналитика по записям\n\n"
         report += f"Всего активных записей: {total_bookings}\n"
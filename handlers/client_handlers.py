@@ -1,9 +1,13 @@
 import telebot
-from datetime import datetime, date, timedelta
+from datetime import datetime
 import data
+import reminders
 import json
 import re  # Для проверки номера телефона
 
+# Сколько ДЗ показывать на одной странице «Мои ДЗ»
+HOMEWORK_PAGE_SIZE = 10
+
 # Хранилище временных данных пользователей
 temp_user_data = {}
 
@@ -53,6 +57,34 @@ def register_client_handlers(bot, admin_ids_list):
             import traceback
             traceback.print_exc() # Печатает полный traceback
 
+    def format_my_bookings(user_bookings):
+        """Текст «Мои записи» по записям из data.load_user_bookings"""
+        response = "📅 Ваши записи на занятия:\n\n"
+        for booking in user_bookings:
+            status = ""
+            if booking.get('cancelled_by_admin', False):
+                status = " (🚫 Запись отменена администратором)"
+            elif not booking['slot_exists'] or booking['slot_deleted_by_admin']:
+                status = " (⚠️ Слот удален администратором)"
+            elif not booking['slot_available']:
+                if booking.get('confirmed', False):
+                    status = " (✅ Подтверждена)"
+                else:
+                    status = " (⏰ Ожидает подтверждения)"
+            else:
+                status = " (❓ Статус неопределен)"
+
+            response += f"📅 {booking['date']} {booking['time']}\n"
+            response += f"👶 {booking['child_name']}\n"
+            response += f"{status}\n"
+            response += "➖➖➖➖➖\n"
+        return response
+
+    def load_cancellable_bookings(user_id):
+        """Будущие записи клиента, которые ещё можно отменить (слот не удалён)"""
+        user_bookings = data.load_user_bookings(user_id, include_cancelled_by_admin=False)
+        return [b for b in user_bookings if b['slot_exists'] and not b['slot_deleted_by_admin']]
+
     @bot.message_handler(commands=['start'])
     def send_welcome(message):
         user_id = message.from_user.id
@@ -115,22 +147,8 @@ def register_client_handlers(bot, admin_ids_list):
         except:
             pass
 
-        slots = data.load_slots()
-        has_available_slots = False
-        today = date.today()
-
-        for date_str, date_slots in slots.items():
-            try:
-                slot_date = datetime.strptime(date_str, "%d.%m.%Y").date()
-                if slot_date >= today:
-                    available_slots = [slot for slot in date_slots if slot.get('available', True) and not slot.get('deleted_by_admin', False)]
-                    if available_slots:
-                        has_available_slots = True
-                        break
-            except ValueError:
-                continue
-
-        if not has_available_slots:
+        # Только открытые слоты в горизонте записи: фильтр и диапазон дат — в БД
+        if not data.load_bookable_slots():
             markup = telebot.types.InlineKeyboardMarkup()
             markup.add(telebot.types.InlineKeyboardButton("📱 Главное меню", callback_data="main_menu"))
             send_or_edit_message(
@@ -144,31 +162,14 @@ def register_client_handlers(bot, admin_ids_list):
 
     def show_available_dates_first_step(message):
         user_id = message.from_user.id
-        slots = data.load_slots()
-        available_dates = []
-
-        today = date.today()
-
-        for date_str, date_slots in slots.items():
-            try:
-                slot_date = datetime.strptime(date_str, "%d.%m.%Y").date()
-                if slot_date >= today:
-                    available_slots = [slot for slot in date_slots if slot.get('available', True)]
-                    if available_slots:
-                        available_dates.append(date_str)
-            except ValueError:
-                continue
+        # Из БД приходят только даты со свободными слотами, в хронологическом порядке
+        available_dates = list(data.load_bookable_slots())
 
         if not available_dates:
             # Убираем ReplyKeyboardRemove
             bot.send_message(message.chat.id, "К сожалению, пока нет доступных дат для записи.")
             return
 
-        try:
-            available_dates.sort(key=lambda x: datetime.strptime(x, "%d.%m.%Y"))
-        except:
-            pass
-
         markup = telebot.types.InlineKeyboardMarkup()
         for date_str in available_dates[:7]:
             markup.add(telebot.types.InlineKeyboardButton(date_str, callback_data=f"select_date_{date_str}"))
@@ -183,27 +184,13 @@ def register_client_handlers(bot, admin_ids_list):
             selected_date = call.data.replace('select_date_', '')
             user_id = call.from_user.id
 
-            slots = data.load_slots()
-            available_slots = []
-
-            if selected_date in slots:
-                for slot in slots[selected_date]:
-                    if slot.get('available', True):
-                        available_slots.append(slot['time'])
+            # Свободные слоты внутри даты уже отсортированы по времени начала
+            available_slots = [slot['time'] for slot in data.load_bookable_slots().get(selected_date, [])]
 
             if not available_slots:
                 bot.answer_callback_query(call.id, "На эту дату нет доступных слотов")
                 return
 
-            def time_sort_key(time_str):
-                try:
-                    hour = int(time_str.split(':')[0])
-                    return hour
-                except:
-                    return 99
-
-            available_slots.sort(key=time_sort_key)
-
             markup = telebot.types.InlineKeyboardMarkup()
             for slot in available_slots:
                 markup.add(telebot.types.InlineKeyboardButton(slot, callback_data=f"select_time_{selected_date}_{slot}"))
@@ -323,8 +310,8 @@ def register_client_handlers(bot, admin_ids_list):
         set_temp_data(user_id, 'temp_phone', phone_input)
         show_final_confirmation_v2(message)
 
-    def show_final_confirmation_v2(message):
-        user_id = message.from_user.id
+    def show_final_confirmation_v2(message, user_id=None):
+        user_id = user_id or message.from_user.id
         selected_date = get_temp_data(user_id, 'booking_date')
         selected_time = get_temp_data(user_id, 'booking_time')
         parent_name = get_temp_data(user_id, 'temp_parent_name')
@@ -349,6 +336,44 @@ def register_client_handlers(bot, admin_ids_list):
 
         bot.send_message(message.chat.id, confirmation_text, reply_markup=markup)
 
+    def offer_alternative_slots(call, selected_date):
+        """Слот только что заняли: предлагаем другое свободное время на эту дату или другую дату."""
+        free_times = [slot['time'] for slot in data.load_bookable_slots().get(selected_date, [])]
+
+        markup = telebot.types.InlineKeyboardMarkup()
+        for slot_time in free_times:
+            markup.add(telebot.types.InlineKeyboardButton(slot_time, callback_data=f"retry_time_{selected_date}_{slot_time}"))
+        markup.add(telebot.types.InlineKeyboardButton("📅 Выбрать другую дату", callback_data="book_lesson"))
+        markup.add(telebot.types.InlineKeyboardButton("📱 Главное меню", callback_data="main_menu"))
+
+        text = "😔 Этот слот только что заняли.\n\n"
+        if free_times:
+            text += f"Свободное время на {selected_date}:"
+        else:
+            text += f"На {selected_date} свободного времени больше нет. Выберите другую дату."
+
+        bot.edit_message_text(
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id,
+            text=text,
+            reply_markup=markup
+        )
+        bot.answer_callback_query(call.id, "Слот уже занят")
+
+    @bot.callback_query_handler(func=lambda call: call.data.startswith('retry_time_'))
+    def process_retry_time_selection(call):
+        """Выбор другого времени после занятого слота: данные клиента уже введены."""
+        try:
+            selected_date, selected_time = call.data.replace('retry_time_', '', 1).split('_', 1)
+            user_id = call.from_user.id
+            set_temp_data(user_id, 'booking_date', selected_date)
+            set_temp_data(user_id, 'booking_time', selected_time)
+            bot.answer_callback_query(call.id)
+            show_final_confirmation_v2(call.message, user_id=user_id)
+        except Exception as e:
+            print(f"Ошибка при выборе другого времени: {e}")
+            bot.answer_callback_query(call.id, "Ошибка при выборе времени")
+
     @bot.callback_query_handler(func=lambda call: call.data == "confirm_booking")
     def process_final_confirmation(call):
         try:
@@ -371,16 +396,6 @@ def register_client_handlers(bot, admin_ids_list):
             data.save_user(user_id, parent_name, phone)
             # ----------------------------------------------------------------
 
-            slots = data.load_slots()
-
-            if selected_date in slots:
-                for slot in slots[selected_date]:
-                    if slot['time'] == selected_time:
-                        slot['available'] = False
-                        break
-
-            data.save_slots(slots)
-
             booking = {
                 "user_id": user_id,
                 "parent_name": parent_name, # Это поле не используется в save_booking, но оставим для совместимости
@@ -392,7 +407,12 @@ def register_client_handlers(bot, admin_ids_list):
                 "confirmed": False
             }
 
-            data.save_booking(booking)
+            # Слот занимается и запись создаётся одной транзакцией
+            status, _ = data.book_slot(booking)
+            if status == data.BOOKING_SLOT_TAKEN:
+                print(f"Слот {selected_date} {selected_time} уже был занят или удалён")
+                offer_alternative_slots(call, selected_date)
+                return
             print(f"Запись сохранена: {booking}")
 
             clear_temp_data(user_id)
@@ -440,10 +460,8 @@ def register_client_handlers(bot, admin_ids_list):
         user_id = call.from_user.id
         print(f"View bookings call from user: {user_id}")
 
-        bookings = data.load_bookings()
-        print(f"Всего записей в системе: {len(bookings)}")
-
-        user_bookings = [b for b in bookings if b['user_id'] == user_id and not b.get('cancelled_by_user', False)]
+        # Записи клиента вместе со статусом слота — один индексированный запрос
+        user_bookings = data.load_user_bookings(user_id)
         print(f"Записей пользователя {user_id}: {len(user_bookings)}")
 
         if not user_bookings:
@@ -457,37 +475,7 @@ def register_client_handlers(bot, admin_ids_list):
             )
             return
 
-        response = "📅 Ваши записи на занятия:\n\n"
-        for booking in user_bookings:
-            print(f"Запись: {booking}")
-            slots = data.load_slots()
-            slot_exists = False
-            slot_available = True
-
-            if booking['date'] in slots:
-                for slot in slots[booking['date']]:
-                    if slot['time'] == booking['time']:
-                        slot_exists = True
-                        slot_available = slot.get('available', True)
-                        break
-
-            status = ""
-            if booking.get('cancelled_by_admin', False):
-                status = " (🚫 Запись отменена администратором)"
-            elif not slot_exists:
-                status = " (⚠️ Слот удален администратором)"
-            elif not slot_available:
-                if booking.get('confirmed', False):
-                    status = " (✅ Подтверждена)"
-                else:
-                    status = " (⏰ Ожидает подтверждения)"
-            else:
-                status = " (❓ Статус неопределен)"
-
-            response += f"📅 {booking['date']} {booking['time']}\n"
-            response += f"👶 {booking['child_name']}\n"
-            response += f"{status}\n"
-            response += "➖➖➖➖➖\n"
+        response = format_my_bookings(user_bookings)
 
         markup = telebot.types.InlineKeyboardMarkup()
         markup.add(telebot.types.InlineKeyboardButton("📱 Главное меню", callback_data="main_menu"))
@@ -519,10 +507,7 @@ def register_client_handlers(bot, admin_ids_list):
         user_id = message.from_user.id
         print(f"Просмотр записей для пользователя {user_id}")
 
-        bookings = data.load_bookings()
-        print(f"Всего записей в системе: {len(bookings)}")
-
-        user_bookings = [b for b in bookings if b['user_id'] == user_id and not b.get('cancelled_by_user', False)]
+        user_bookings = data.load_user_bookings(user_id)
         print(f"Записей пользователя {user_id}: {len(user_bookings)}")
 
         if not user_bookings:
@@ -536,36 +521,7 @@ def register_client_handlers(bot, admin_ids_list):
             )
             return
 
-        response = "📅 Ваши записи на занятия:\n\n"
-        for booking in user_bookings:
-            slots = data.load_slots()
-            slot_exists = False
-            slot_available = True
-
-            if booking['date'] in slots:
-                for slot in slots[booking['date']]:
-                    if slot['time'] == booking['time']:
-                        slot_exists = True
-                        slot_available = slot.get('available', True)
-                        break
-
-            status = ""
-            if booking.get('cancelled_by_admin', False):
-                status = " (🚫 Запись отменена администратором)"
-            elif not slot_exists:
-                status = " (⚠️ Слот удален администратором)"
-            elif not slot_available:
-                if booking.get('confirmed', False):
-                    status = " (✅ Подтверждена)"
-                else:
-                    status = " (⏰ Ожидает подтверждения)"
-            else:
-                status = " (❓ Статус неопределен)"
-
-            response += f"📅 {booking['date']} {booking['time']}\n"
-            response += f"👶 {booking['child_name']}\n"
-            response += f"{status}\n"
-            response += "➖➖➖➖➖\n"
+        response = format_my_bookings(user_bookings)
 
         markup = telebot.types.InlineKeyboardMarkup()
         markup.add(telebot.types.InlineKeyboardButton("📱 Главное меню", callback_data="main_menu"))
@@ -576,13 +532,20 @@ def register_client_handlers(bot, admin_ids_list):
             reply_markup=markup
         )
 
-    @bot.callback_query_handler(func=lambda call: call.data == "my_homework")
+    @bot.callback_query_handler(func=lambda call: call.data == "my_homework" or call.data.startswith("my_homework_page_"))
     def client_view_homework_call(call):
-        """Показывает клиенту его домашние задания."""
+        """Показывает клиенту его домашние задания (постранично)."""
         user_id = call.from_user.id
         print(f"client_view_homework_call вызвана для пользователя: {user_id}")
 
-        homeworks = data.load_homeworks_for_user(user_id)
+        offset = 0
+        if call.data.startswith("my_homework_page_"):
+            offset = int(call.data.replace("my_homework_page_", ""))
+
+        # Одним запросом вместе с датой и временем занятия; лишняя строка — признак следующей страницы
+        homeworks = data.load_homeworks_for_user(user_id, limit=HOMEWORK_PAGE_SIZE + 1, offset=offset)
+        has_more = len(homeworks) > HOMEWORK_PAGE_SIZE
+        homeworks = homeworks[:HOMEWORK_PAGE_SIZE]
 
         if not homeworks:
             send_or_edit_message(
@@ -591,21 +554,22 @@ def register_client_handlers(bot, admin_ids_list):
                 "У вас пока нет домашних заданий.",
                 reply_markup=telebot.types.InlineKeyboardMarkup().add(telebot.types.InlineKeyboardButton("📱 Главное меню", callback_data="main_menu"))
             )
+            bot.answer_callback_query(call.id)
             return
 
         response = "📚 Ваши домашние задания:\n\n"
         for hw in homeworks:
-            # Загружаем информацию о записи, чтобы показать дату и время занятия
-            all_bookings = data.load_bookings()
-            booking = next((b for b in all_bookings if b['id'] == hw['booking_id']), None)
-            date_time_str = f"{booking['date']} {booking['time']}" if booking else "Неизвестное занятие"
-            response += f"📅 Занятие: {date_time_str}\n"
+            response += f"📅 Занятие: {hw['booking_date']} {hw['booking_time']} ({hw['child_name']})\n"
             response += f"📅 Отправлено: {hw['sent_at']}\n"
             if hw['comment']:
                 response += f"📝 Комментарий: {hw['comment']}\n"
             response += "➖➖➖➖➖\n"
 
         markup = telebot.types.InlineKeyboardMarkup()
+        if offset > 0:
+            markup.add(telebot.types.InlineKeyboardButton("⬅️ Назад", callback_data=f"my_homework_page_{max(offset - HOMEWORK_PAGE_SIZE, 0)}"))
+        if has_more:
+            markup.add(telebot.types.InlineKeyboardButton("➡️ Далее", callback_data=f"my_homework_page_{offset + HOMEWORK_PAGE_SIZE}"))
         markup.add(telebot.types.InlineKeyboardButton("📱 Главное меню", callback_data="main_menu"))
 
         send_or_edit_message(
@@ -620,9 +584,7 @@ def register_client_handlers(bot, admin_ids_list):
     @bot.message_handler(func=lambda message: message.text == "❌ Отменить запись")
     def cancel_booking(message):
         user_id = message.from_user.id
-        bookings = data.load_bookings()
-
-        user_bookings = [b for b in bookings if b['user_id'] == user_id and not b.get('cancelled_by_user', False)]
+        user_bookings = load_cancellable_bookings(user_id)
 
         if not user_bookings:
             markup = telebot.types.InlineKeyboardMarkup()
@@ -636,9 +598,9 @@ def register_client_handlers(bot, admin_ids_list):
             return
 
         markup = telebot.types.InlineKeyboardMarkup()
-        for i, booking in enumerate(user_bookings):
+        for booking in user_bookings:
             button_text = f"{booking['date']} {booking['time']} - {booking['child_name']}"
-            callback_data = f"cancel_{i}_{user_id}"
+            callback_data = f"cancel_{booking['id']}_{user_id}"
             markup.add(telebot.types.InlineKeyboardButton(button_text, callback_data=callback_data))
 
         markup.add(telebot.types.InlineKeyboardButton("📱 Главное меню", callback_data="main_menu"))
@@ -653,30 +615,7 @@ def register_client_handlers(bot, admin_ids_list):
         user_id = call.from_user.id
         print(f"Отмена записей для пользователя {user_id}")
 
-        bookings = data.load_bookings()
-        print(f"Всего записей в системе: {len(bookings)}")
-
-        slots = data.load_slots()
-        user_bookings = [
-            b for b in bookings
-            if (
-                b['user_id'] == user_id and
-                not b.get('cancelled_by_user', False) and
-                not b.get('cancelled_by_admin', False)
-            )
-        ]
-
-        active_user_bookings = []
-        for b in user_bookings:
-            slot_exists = False
-            if b['date'] in slots:
-                for slot in slots[b['date']]:
-                    if slot['time'] == b['time']:
-                        slot_exists = True
-                        break
-            if slot_exists:
-                active_user_bookings.append(b)
-
+        active_user_bookings = load_cancellable_bookings(user_id)
         print(f"Активных записей пользователя {user_id}: {len(active_user_bookings)}")
 
         if not active_user_bookings:
@@ -691,9 +630,9 @@ def register_client_handlers(bot, admin_ids_list):
             return
 
         markup = telebot.types.InlineKeyboardMarkup()
-        for i, booking in enumerate(active_user_bookings):
+        for booking in active_user_bookings:
             button_text = f"{booking['date']} {booking['time']} - {booking['child_name']}"
-            callback_data = f"cancel_{i}_{user_id}"
+            callback_data = f"cancel_{booking['id']}_{user_id}"
             markup.add(telebot.types.InlineKeyboardButton(button_text, callback_data=callback_data))
 
         markup.add(telebot.types.InlineKeyboardButton("📱 Главное меню", callback_data="main_menu"))
@@ -704,51 +643,25 @@ def register_client_handlers(bot, admin_ids_list):
             reply_markup=markup, call=call
         )
 
-    @bot.callback_query_handler(func=lambda call: call.data.startswith('cancel_'))
+    @bot.callback_query_handler(func=lambda call: call.data.startswith('cancel_') and not call.data.startswith('cancel_reminder_'))
     def process_cancel_callback(call):
         try:
             print(f"Process cancel callback: {call.data} from user: {call.from_user.id}")
             parts = call.data.split('_')
             if len(parts) >= 3:
-                index = int(parts[1])
+                booking_id = int(parts[1])
                 booking_user_id = int(parts[2])
 
                 if call.from_user.id != booking_user_id:
                     bot.answer_callback_query(call.id, "Ошибка: вы можете отменять только свои записи")
                     return
 
-                bookings = data.load_bookings()
-                user_bookings = [b for b in bookings if b['user_id'] == booking_user_id and not b.get('cancelled_by_user', False) and not b.get('cancelled_by_admin', False)]
-                print(f"Найдено {len(user_bookings)} записей пользователя для отмены")
+                # Отмена записи и освобождение слота — одна точечная транзакция
+                booking_to_cancel = data.cancel_booking(booking_id=booking_id, user_id=booking_user_id)
 
-                if index < len(user_bookings):
-                    booking_to_cancel = user_bookings[index]
+                if booking_to_cancel:
                     print(f"Отмена записи: {booking_to_cancel}")
 
-                    slots = data.load_slots()
-                    date = booking_to_cancel['date']
-                    time = booking_to_cancel['time']
-
-                    slot_found = False
-                    if date in slots:
-                        for slot in slots[date]:
-                            if slot['time'] == time:
-                                slot['available'] = True
-                                slot_found = True
-                                break
-
-                    if slot_found:
-                        data.save_slots(slots)
-
-                    for booking in bookings:
-                        if (booking['user_id'] == booking_user_id and 
-                            booking['date'] == booking_to_cancel['date'] and 
-                            booking['time'] == booking_to_cancel['time']):
-                            booking['cancelled_by_user'] = True
-                            break
-
-                    data.save_bookings(bookings)
-
                     markup = telebot.types.InlineKeyboardMarkup()
                     markup.add(telebot.types.InlineKeyboardButton("📱 Главное меню", callback_data="main_menu"))
 
@@ -773,90 +686,54 @@ def register_client_handlers(bot, admin_ids_list):
     def process_reminder_callback(call):
         try:
             if call.data.startswith('confirm_'):
-                parts = call.data.split('_', 2)
-                if len(parts) < 3:
+                # confirm_{user_id}_{дата}_{время}
+                parts = call.data.split('_', 3)
+                if len(parts) < 4:
                     bot.answer_callback_query(call.id, "Ошибка: некорректные данные")
                     return
 
                 user_id = int(parts[1])
                 date = parts[2]
-                time_slot = parts[3] if len(parts) > 3 else "_".join(parts[3:])
+                time_slot = parts[3]
 
                 if call.from_user.id != user_id:
                     bot.answer_callback_query(call.id, "Ошибка: вы можете подтверждать только свои записи")
                     return
 
-                bookings = data.load_bookings()
-                booking_found = False
-
-                for booking in bookings:
-                    if (booking['user_id'] == user_id and 
-                        booking['date'] == date and 
-                        booking['time'] == time_slot):
-                        booking['confirmed'] = True
-                        booking_found = True
-                        break
-
-                if booking_found:
-                    data.save_bookings(bookings)
-                    bot.edit_message_text(
-                        chat_id=call.message.chat.id,
-                        message_id=call.message.message_id,
-                        text=f"✅ Запись подтверждена!\n\n"
-                             f"Дата: {date}\n"
-                             f"Время: {time_slot}\n\n"
-                             f"Спасибо за подтверждение!"
-                    )
-                else:
-                    bot.answer_callback_query(call.id, "Ошибка: запись не найдена")
+                # Отвечаем сразу; в БД подтверждение попадёт со следующей пачкой
+                reminders.queue_response(user_id, date, time_slot, data.REMINDER_CONFIRM)
+                bot.edit_message_text(
+                    chat_id=call.message.chat.id,
+                    message_id=call.message.message_id,
+                    text=f"✅ Запись подтверждена!\n\n"
+                         f"Дата: {date}\n"
+                         f"Время: {time_slot}\n\n"
+                         f"Спасибо за подтверждение!"
+                )
 
             elif call.data.startswith('cancel_reminder_'):
-                parts = call.data.split('_', 3)
-                if len(parts) < 4:
+                # cancel_reminder_{user_id}_{дата}_{время}
+                parts = call.data.split('_', 4)
+                if len(parts) < 5:
                     bot.answer_callback_query(call.id, "Ошибка: некорректные данные")
                     return
 
                 user_id = int(parts[2])
                 date = parts[3]
-                time_slot = parts[4] if len(parts) > 4 else "_".join(parts[4:])
+                time_slot = parts[4]
 
                 if call.from_user.id != user_id:
                     bot.answer_callback_query(call.id, "Ошибка: вы можете отменять только свои записи")
                     return
 
-                slots = data.load_slots()
-                slot_found = False
-                if date in slots:
-                    for slot in slots[date]:
-                        if slot['time'] == time_slot:
-                            slot['available'] = True
-                            slot_found = True
-                            break
-
-                if slot_found:
-                    data.save_slots(slots)
-
-                bookings = data.load_bookings()
-                booking_found = False
-                for booking in bookings:
-                    if (booking['user_id'] == user_id and 
-                        booking['date'] == date and 
-                        booking['time'] == time_slot):
-                        booking['cancelled_by_user'] = True
-                        booking_found = True
-                        break
-
-                if booking_found:
-                    data.save_bookings(bookings)
-                    bot.edit_message_text(
-                        chat_id=call.message.chat.id,
-                        message_id=call.message.message_id,
-                        text=f"❌ Запись отменена по вашему запросу:\n\n"
-                             f"Дата: {date}\n"
-                             f"Время: {time_slot}"
-                    )
-                else:
-                    bot.answer_callback_query(call.id, "Ошибка: запись не найдена")
+                reminders.queue_response(user_id, date, time_slot, data.REMINDER_CANCEL)
+                bot.edit_message_text(
+                    chat_id=call.message.chat.id,
+                    message_id=call.message.message_id,
+                    text=f"❌ Запись отменена по вашему запросу:\n\n"
+                         f"Дата: {date}\n"
+                         f"Время: {time_slot}"
+                )
 
         except Exception as e:
             bot.answer_callback_query(call.id, f"Ошибка при обработке: {str(e)}")
\ No newline at end of file
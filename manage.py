@@ -0,0 +1,140 @@
+import argparse
+import json
+import sys
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+import config
+import data
+import migrations
+
+
+def backfill_analytics(args):
+    """Пересчитывает сводные таблицы аналитики по всей истории записей."""
+    print("Пересчёт сводных таблиц аналитики...")
+    days = data.rebuild_analytics_rollups()
+    print(f"Готово: {days} дн. в analytics_daily.")
+
+
+def archive(args):
+    """Переносит прошедшие слоты и записи старше горизонта в архивные таблицы."""
+    before = data.archive_horizon(days=args.days)
+    print(f"Архивирование занятий до {before:%d.%m.%Y}...")
+    slots, bookings = data.archive_past(before, batch_size=args.batch_size)
+    print(f"Готово: слотов {slots}, записей {bookings}.")
+
+
+def post_updates(args):
+    """Отправляет записанные обновления Telegram на локальный webhook (для проверки)."""
+    with open(args.file, encoding='utf-8') as f:
+        text = f.read().strip()
+    # Файл — JSON-массив обновлений или по одному обновлению в строке
+    updates = json.loads(text) if text.startswith('[') else [json.loads(line) for line in text.splitlines() if line.strip()]
+    url = args.url or f"http://127.0.0.1:{config.WEBHOOK_LISTEN_PORT}{config.WEBHOOK_PATH}"
+    secret = args.secret if args.secret is not None else (config.WEBHOOK_SECRET or '')
+
+    started = time.perf_counter()
+    for update in updates:
+        request = urllib.request.Request(
+            url,
+            data=json.dumps(update).encode('utf-8'),
+            headers={'Content-Type': 'application/json', 'X-Telegram-Bot-Api-Secret-Token': secret},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        print(f"update_id {update.get('update_id')}: {status}")
+    elapsed = time.perf_counter() - started
+    print(f"Отправлено {len(updates)} обновлений за {elapsed * 1000:.0f} мс")
+
+
+def migrate(args):
+    """Применяет недостающие миграции схемы или (с --check) только сообщает о них."""
+    version = migrations.current_version()
+    pending = migrations.pending_migrations(version)
+    print(f"Версия схемы БД: {version}, последняя известная: {migrations.LATEST_VERSION}")
+    if args.check:
+        for number, name, _ in pending:
+            print(f"  не применена: {number:04d}_{name}")
+        if pending:
+            sys.exit(1)
+        return
+    if not pending:
+        print("Схема актуальна.")
+        return
+    applied = migrations.apply_migrations()
+    print(f"Применено миграций: {len(applied)}.")
+
+
+def bench_prepared(args):
+    """Сравнивает время частых запросов: обычный cursor.execute и подготовленные запросы."""
+    backend = data.get_backend()
+    if backend.name != 'postgresql':
+        print(f"Бэкенд {backend.name}: драйвер всегда кэширует подготовленные запросы, режимы не отличаются.")
+    today = datetime.now().date()
+    cases = [
+        ('load_user_bookings', lambda: data.load_user_bookings(args.user_id)),
+        ('load_slots (с сегодняшнего дня)', lambda: data.load_slots(from_date=today, use_cache=False)),
+    ]
+    original = backend.prepare_statements
+    try:
+        for title, call in cases:
+            per_call = {}
+            for prepared in (False, True):
+                backend.prepare_statements = prepared
+                for _ in range(min(args.iterations, 50)):  # прогрев: соединения и PREPARE
+                    call()
+                started = time.perf_counter()
+                for _ in range(args.iterations):
+                    call()
+                per_call[prepared] = (time.perf_counter() - started) / args.iterations * 1e6
+            saving = per_call[False] - per_call[True]
+            print(f"{title}: execute {per_call[False]:.0f} мкс/вызов, prepared {per_call[True]:.0f} мкс/вызов, "
+                  f"экономия {saving:.0f} мкс ({saving / per_call[False] * 100:.0f}%)")
+    finally:
+        backend.prepare_statements = original
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Служебные команды бота")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    migrate_parser = subparsers.add_parser('migrate', help="применить миграции схемы БД")
+    migrate_parser.add_argument('--check', action='store_true',
+                                help="только проверить; код выхода 1, если есть неприменённые миграции")
+    migrate_parser.set_defaults(func=migrate)
+
+    backfill = subparsers.add_parser('backfill-analytics', help="пересчитать сводные таблицы аналитики")
+    backfill.set_defaults(func=backfill_analytics)
+
+    archive_parser = subparsers.add_parser('archive', help="перенести прошедшие занятия в архив")
+    archive_parser.add_argument('--days', type=int, default=None,
+                                help="архивировать занятия старше стольких дней (по умолчанию ARCHIVE_AFTER_DAYS)")
+    archive_parser.add_argument('--batch-size', type=int, default=None,
+                                help="строк за одну транзакцию (по умолчанию ARCHIVE_BATCH_SIZE)")
+    archive_parser.set_defaults(func=archive)
+
+    bench = subparsers.add_parser('bench-prepared', help="замерить выигрыш от подготовленных запросов")
+    bench.add_argument('--iterations', type=int, default=1000)
+    bench.add_argument('--user-id', type=int, default=0, help="клиент для load_user_bookings")
+    bench.set_defaults(func=bench_prepared)
+
+    post = subparsers.add_parser('post-updates', help="отправить записанные обновления на локальный webhook")
+    post.add_argument('file', help="JSON-массив обновлений или JSON по одному в строке")
+    post.add_argument('--url', help="адрес webhook (по умолчанию локальный сервер из настроек)")
+    post.add_argument('--secret', help="секрет (по умолчанию WEBHOOK_SECRET)")
+    post.set_defaults(func=post_updates)
+
+    args = parser.parse_args()
+    try:
+        args.func(args)
+    finally:
+        data.close_pool()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+import data
+
+
+class MigrationError(Exception):
+    """Миграцию нельзя применить без ручного вмешательства."""
+
+# Версионированные миграции схемы БД.
+#
+# Каждая миграция — (версия, имя, функция без аргументов). Версии идут строго по возрастанию и
+# после выпуска не меняются: новое изменение схемы — новая миграция в конце списка.
+# Применённые версии записываются в таблицу schema_version. Миграции написаны
+# идемпотентно (IF NOT EXISTS), поэтому базы, созданные до появления schema_version,
+# проходят их без ошибок. DDL пишется для PostgreSQL и приводится к диалекту
+# текущего бэкенда через backend.ddl().
+
+
+def _initial_schema():
+    """Таблицы users, slots, bookings, homeworks."""
+    with data.db_connection() as conn:
+        _create_initial_tables(conn.cursor())
+        conn.commit()
+
+
+def _create_initial_tables(cursor):
+    ddl = data.get_backend().ddl
+    cursor.execute(ddl('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id BIGINT PRIMARY KEY,
+            parent_name TEXT NOT NULL,
+            phone TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    '''))
+    cursor.execute(ddl('''
+        CREATE TABLE IF NOT EXISTS slots (
+            id SERIAL PRIMARY KEY,
+            date TEXT NOT NULL, -- в формате 'DD.MM.YYYY'
+            time TEXT NOT NULL, -- в формате 'HH:MM-HH:MM'
+            available BOOLEAN DEFAULT TRUE,
+            deleted_by_admin BOOLEAN DEFAULT FALSE
+        )
+    '''))
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_slots_date_time ON slots (date, time)')
+    cursor.execute(ddl('''
+        CREATE TABLE IF NOT EXISTS bookings (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            date TEXT NOT NULL, -- в формате 'DD.MM.YYYY'
+            time TEXT NOT NULL, -- в формате 'HH:MM-HH:MM'
+            child_name TEXT NOT NULL,
+            phone TEXT,
+            parent_name TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            confirmed BOOLEAN DEFAULT FALSE,
+            cancelled_by_user BOOLEAN DEFAULT FALSE,
+            cancelled_by_admin BOOLEAN DEFAULT FALSE,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    '''))
+    # Старые базы создавались без parent_name
+    data.get_backend().add_columns(cursor, 'bookings', [('parent_name', 'TEXT')])
+    cursor.execute(ddl('''
+        CREATE TABLE IF NOT EXISTS homeworks (
+            id SERIAL PRIMARY KEY,
+            booking_id INTEGER NOT NULL,
+            file_id TEXT NOT NULL,
+            file_type TEXT NOT NULL,
+            comment TEXT,
+            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sent_by_admin_id BIGINT,
+            FOREIGN KEY (booking_id) REFERENCES bookings (id)
+        )
+    '''))
+
+
+def _typed_datetime_columns():
+    """lesson_date, start_time, end_time, starts_at в slots и bookings (с заполнением пачками)."""
+    data.migrate_typed_datetime_columns()
+
+
+def _starts_at_indexes():
+    """Индексы сортировки, keyset-пагинации и «Моих записей»."""
+    data.create_indexes([
+        # (starts_at, id) — ключ сортировки и keyset-пагинации
+        ('idx_slots_starts_at', 'slots (starts_at, id)'),
+        ('idx_slots_lesson_date', 'slots (lesson_date)'),
+        ('idx_bookings_starts_at', 'bookings (starts_at, id)'),
+        # «Мои записи»: записи одного клиента в порядке начала занятий
+        ('idx_bookings_user_starts_at', 'bookings (user_id, starts_at)'),
+    ])
+
+
+def _analytics_rollups():
+    """Сводные таблицы аналитики, их заполнение по истории и индексы для топ-5."""
+    with data.db_connection() as conn:
+        _create_analytics_tables(conn.cursor())
+        conn.commit()
+
+    # Архивных таблиц на этой версии схемы ещё нет (они появляются в миграции 7)
+    days = data.rebuild_analytics_rollups(include_archive=False)
+    print(f"Сводные таблицы аналитики заполнены: {days} дн.")
+
+    data.create_indexes([
+        # Топ-5 для аналитики читается прямо из индекса
+        ('idx_analytics_children_top', 'analytics_children (bookings DESC, child_name)'),
+        ('idx_analytics_user_cancellations_top', 'analytics_user_cancellations (cancellations DESC, user_id)'),
+    ])
+
+
+def _create_analytics_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_daily (
+            day DATE PRIMARY KEY, -- день создания записи (bookings.timestamp)
+            created INTEGER NOT NULL DEFAULT 0,
+            confirmed INTEGER NOT NULL DEFAULT 0, -- подтверждены и не отменены клиентом
+            cancelled INTEGER NOT NULL DEFAULT 0 -- отменены клиентом
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_children (
+            child_name TEXT PRIMARY KEY,
+            bookings INTEGER NOT NULL DEFAULT 0 -- записи, не отменённые клиентом
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_user_cancellations (
+            user_id BIGINT PRIMARY KEY,
+            cancellations INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def _active_booking_per_slot():
+    """Частичный уникальный индекс: не больше одной активной записи на слот."""
+    with data.db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT date, time, COUNT(*) FROM bookings
+            WHERE cancelled_by_user = FALSE AND cancelled_by_admin = FALSE
+            GROUP BY date, time
+            HAVING COUNT(*) > 1
+            ORDER BY date, time
+        ''')
+        duplicates = cursor.fetchall()
+    if duplicates:
+        slots = ', '.join(f"{slot_date} {slot_time} ({count})" for slot_date, slot_time, count in duplicates)
+        raise MigrationError(
+            f"На некоторые слоты уже есть несколько активных записей: {slots}. "
+            "Отмените лишние записи и повторите: python manage.py migrate"
+        )
+
+    data.create_indexes([
+        ('idx_bookings_active_slot',
+         'bookings (date, time) WHERE cancelled_by_user = FALSE AND cancelled_by_admin = FALSE'),
+    ], unique=True)
+
+
+def _homework_indexes():
+    """Индекс для соединения homeworks с bookings («Мои ДЗ», ДЗ по записи)."""
+    # Поиск записей клиента покрывает idx_bookings_user_starts_at (user_id — первый столбец)
+    data.create_indexes([
+        ('idx_homeworks_booking_id', 'homeworks (booking_id, sent_at)'),
+    ])
+
+
+def _archive_tables():
+    """Архивные таблицы прошедших слотов, записей и их ДЗ (data.archive_past)."""
+    with data.db_connection() as conn:
+        _create_archive_tables(conn.cursor())
+        conn.commit()
+
+    data.create_indexes([
+        # История администратора: keyset по (starts_at, id) и соединение со слотами
+        ('idx_bookings_archive_starts_at', 'bookings_archive (starts_at, id)'),
+        ('idx_slots_archive_date_time', 'slots_archive (date, time)'),
+        # «Мои ДЗ» по архивным записям
+        ('idx_bookings_archive_user_starts_at', 'bookings_archive (user_id, starts_at)'),
+        ('idx_homeworks_archive_booking_id', 'homeworks_archive (booking_id, sent_at)'),
+    ])
+
+
+def _create_archive_tables(cursor):
+    # Те же столбцы, что в горячих таблицах; id переносятся как есть
+    ddl = data.get_backend().ddl
+    cursor.execute(ddl('''
+        CREATE TABLE IF NOT EXISTS slots_archive (
+            id INTEGER PRIMARY KEY,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            available BOOLEAN,
+            deleted_by_admin BOOLEAN,
+            lesson_date DATE,
+            start_time TIME,
+            end_time TIME,
+            starts_at TIMESTAMP,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    '''))
+    cursor.execute(ddl('''
+        CREATE TABLE IF NOT EXISTS bookings_archive (
+            id INTEGER PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            child_name TEXT NOT NULL,
+            phone TEXT,
+            parent_name TEXT,
+            timestamp TIMESTAMP,
+            confirmed BOOLEAN,
+            cancelled_by_user BOOLEAN,
+            cancelled_by_admin BOOLEAN,
+            lesson_date DATE,
+            start_time TIME,
+            end_time TIME,
+            starts_at TIMESTAMP,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    '''))
+    cursor.execute(ddl('''
+        CREATE TABLE IF NOT EXISTS homeworks_archive (
+            id INTEGER PRIMARY KEY,
+            booking_id INTEGER NOT NULL,
+            file_id TEXT NOT NULL,
+            file_type TEXT NOT NULL,
+            comment TEXT,
+            sent_at TIMESTAMP,
+            sent_by_admin_id BIGINT,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    '''))
+
+
+def _open_slots_index():
+    """Частичный индекс открытых слотов для выбора даты и времени записи."""
+    # Открытых слотов немного (занятые не индексируются, прошедшие уходят в архив)
+    data.create_indexes([
+        ('idx_slots_open_starts_at', 'slots (starts_at, id) WHERE available = TRUE AND deleted_by_admin = FALSE'),
+    ])
+
+
+MIGRATIONS = [
+    (1, 'initial_schema', _initial_schema),
+    (2, 'typed_datetime_columns', _typed_datetime_columns),
+    (3, 'starts_at_indexes', _starts_at_indexes),
+    (4, 'analytics_rollups', _analytics_rollups),
+    (5, 'active_booking_per_slot', _active_booking_per_slot),
+    (6, 'homework_indexes', _homework_indexes),
+    (7, 'archive_tables', _archive_tables),
+    (8, 'open_slots_index', _open_slots_index),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version():
+    """Возвращает версию схемы БД (0, если миграции ещё не применялись)."""
+    with data.db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version')
+            return cursor.fetchone()[0]
+        except Exception as e:
+            if not data.get_backend().is_undefined_table(e):
+                raise
+            conn.rollback()
+            return 0
+
+
+def pending_migrations(version=None):
+    """Список миграций, которые ещё не применены к БД."""
+    if version is None:
+        version = current_version()
+    return [migration for migration in MIGRATIONS if migration[0] > version]
+
+
+def apply_migrations():
+    """Применяет все недостающие миграции по порядку. Возвращает список применённых версий."""
+    applied = []
+    backend = data.get_backend()
+    with backend.migration_lock():
+        with data.db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(backend.ddl('''
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            '''))
+            conn.commit()
+
+        # Версию перечитываем под блокировкой: другой процесс мог успеть всё применить
+        for version, name, migration in pending_migrations():
+            print(f"Миграция {version:04d}_{name}...")
+            migration()
+            with data.db_connection() as conn:
+                conn.cursor().execute(
+                    'INSERT INTO schema_version (version, name) VALUES (%s, %s)',
+                    (version, name)
+                )
+                conn.commit()
+            applied.append(version)
+    return applied
+
+
+def ensure_schema():
+    """Проверка схемы при запуске бота.
+
+    Обычно это один запрос версии без какого-либо DDL; миграции применяются,
+    только если схема отстаёт от кода.
+    """
+    version = current_version()
+    if version == LATEST_VERSION:
+        return
+    if version > LATEST_VERSION:
+        print(f"ПРЕДУПРЕЖДЕНИЕ: версия схемы БД ({version}) новее, чем известна коду ({LATEST_VERSION}).")
+        return
+    applied = apply_migrations()
+    print(f"Схема БД обновлена до версии {LATEST_VERSION} (применено миграций: {len(applied)}).")
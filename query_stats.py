@@ -0,0 +1,174 @@
+import functools
+import inspect
+import threading
+import time
+
+
+class QueryStats:
+    """Потокобезопасные замеры времени функций работы с БД.
+
+    Для каждой функции копятся число вызовов, ошибки, суммарное и максимальное время,
+    гистограмма задержек (границы BUCKETS_MS), число возвращённых строк и время
+    ожидания свободного соединения из пула. Вызовы дольше slow_threshold_ms пишутся
+    в лог с замаскированными аргументами: видны только их типы и размеры.
+    """
+
+    BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self, slow_threshold_ms=500.0):
+        self.slow_threshold_ms = slow_threshold_ms
+        self._lock = threading.Lock()
+        self._functions = {}
+        self._local = threading.local()  # стек активных вызовов потока (для времени ожидания)
+
+    def timed(self, func):
+        """Декоратор: замеряет вызовы func. Для возвращённого генератора — время его перебора."""
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            call = {'wait': 0.0, 'elapsed': 0.0, 'rows': 0}
+            stack = self._stack()
+            stack.append(call)
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                call['elapsed'] = time.perf_counter() - started
+                self._record(name, call, args, kwargs, failed=True)
+                raise
+            finally:
+                stack.pop()
+            call['elapsed'] = time.perf_counter() - started
+            if inspect.isgenerator(result):
+                return self._timed_iter(name, result, call, args, kwargs)
+            call['rows'] = _count_rows(result)
+            self._record(name, call, args, kwargs)
+            return result
+        return wrapper
+
+    def _timed_iter(self, name, iterator, call, args, kwargs):
+        # Учитывается только время внутри генератора, а не обработка строк вызывающим.
+        # Стек берётся на каждом шаге: генератор могут перебирать из разных потоков
+        failed = False
+        try:
+            while True:
+                stack = self._stack()
+                stack.append(call)
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                except Exception:
+                    failed = True
+                    raise
+                finally:
+                    call['elapsed'] += time.perf_counter() - started
+                    stack.pop()
+                call['rows'] += 1
+                yield item
+        finally:
+            iterator.close()
+            self._record(name, call, args, kwargs, failed=failed)
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def add_wait(self, seconds):
+        """Добавляет время ожидания соединения к текущему замеряемому вызову потока."""
+        stack = getattr(self._local, 'stack', None)
+        if stack:
+            stack[-1]['wait'] += seconds
+
+    def _record(self, name, call, args, kwargs, failed=False):
+        elapsed_ms = call['elapsed'] * 1000
+        bucket = next((i for i, bound in enumerate(self.BUCKETS_MS) if elapsed_ms <= bound), len(self.BUCKETS_MS))
+        with self._lock:
+            entry = self._functions.get(name)
+            if entry is None:
+                entry = self._functions[name] = {
+                    'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0,
+                    'wait_ms': 0.0, 'slow': 0, 'histogram': [0] * (len(self.BUCKETS_MS) + 1),
+                }
+            entry['calls'] += 1
+            entry['errors'] += failed
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+            entry['rows'] += call['rows']
+            entry['wait_ms'] += call['wait'] * 1000
+            entry['histogram'][bucket] += 1
+            slow = elapsed_ms >= self.slow_threshold_ms
+            entry['slow'] += slow
+        if slow:
+            print(f"Медленный запрос: {name}({redact_args(args, kwargs)}) — {elapsed_ms:.0f} мс "
+                  f"(ожидание соединения {call['wait'] * 1000:.0f} мс, строк {call['rows']})")
+
+    def percentile(self, histogram, fraction):
+        """Верхняя граница корзины гистограммы, в которую попадает доля fraction вызовов (мс)."""
+        total = sum(histogram)
+        if not total:
+            return 0
+        threshold = total * fraction
+        seen = 0
+        for bound, count in zip(self.BUCKETS_MS + (float('inf'),), histogram):
+            seen += count
+            if seen >= threshold:
+                return bound
+        return float('inf')
+
+    def snapshot(self):
+        """Замеры по функциям, от самых затратных по суммарному времени."""
+        with self._lock:
+            entries = [(name, dict(entry, histogram=list(entry['histogram'])))
+                       for name, entry in self._functions.items()]
+        result = []
+        for name, entry in entries:
+            calls = entry['calls']
+            result.append(dict(
+                entry,
+                name=name,
+                avg_ms=entry['total_ms'] / calls,
+                p95_ms=self.percentile(entry['histogram'], 0.95),
+                avg_rows=entry['rows'] / calls,
+                avg_wait_ms=entry['wait_ms'] / calls,
+            ))
+        result.sort(key=lambda entry: -entry['total_ms'])
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._functions.clear()
+
+
+def _count_rows(result):
+    """Сколько строк вернула функция: списки, словари списков, страницы (список, курсор)."""
+    if result is None or isinstance(result, (bool, int, float, str)):
+        return 0
+    if hasattr(result, '_fields'):  # одна запись из records.py
+        return 1
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple) and result and isinstance(result[0], list):
+        return len(result[0])
+    if isinstance(result, dict) and all(isinstance(value, list) for value in result.values()):
+        return sum(len(value) for value in result.values())
+    return 1
+
+
+def _redact(value):
+    if value is None or isinstance(value, bool):
+        return repr(value)
+    if isinstance(value, (str, bytes, list, tuple, dict, set)):
+        return f"<{type(value).__name__} len={len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def redact_args(args, kwargs):
+    """Аргументы вызова без значений (персональные данные не попадают в лог)."""
+    parts = [_redact(value) for value in args]
+    parts += [f"{key}={_redact(value)}" for key, value in kwargs.items()]
+    return ', '.join(parts)
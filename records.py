@@ -0,0 +1,72 @@
+from collections import namedtuple
+
+
+def record_type(name, fields):
+    """Создаёт неизменяемый компактный тип записи на основе namedtuple.
+
+    Экземпляры не имеют __dict__ (__slots__ = ()), строятся прямо из строки
+    кортежного курсора через _make() и поддерживают доступ как к атрибутам,
+    так и в стиле словаря (record['date'], record.get('confirmed', False),
+    'date' in record, dict(record)), поэтому обработчики работают с ними так же,
+    как раньше со словарями.
+    """
+    base = namedtuple(name, fields)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self._fields else default
+
+    def keys(self):
+        return self._fields
+
+    def items(self):
+        return zip(self._fields, self)
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    namespace = {
+        '__slots__': (),
+        '__getitem__': __getitem__,
+        'get': get,
+        'keys': keys,
+        'items': items,
+        '__contains__': __contains__,
+    }
+    return type(name, (base,), namespace)
+
+
+Slot = record_type('Slot', [
+    'id', 'date', 'time', 'available', 'deleted_by_admin', 'starts_at',
+])
+
+Booking = record_type('Booking', [
+    'id', 'user_id', 'date', 'time', 'child_name', 'phone', 'parent_name', 'timestamp',
+    'confirmed', 'cancelled_by_user', 'cancelled_by_admin', 'starts_at',
+])
+
+# Запись клиента вместе со статусом её слота (data.load_user_bookings)
+UserBooking = record_type('UserBooking', Booking._fields + (
+    'slot_exists', 'slot_available', 'slot_deleted_by_admin',
+))
+
+# Строка обзора записей администратора (data.load_bookings_overview_page)
+BookingOverview = record_type('BookingOverview', Booking._fields + (
+    'overview_status',
+))
+
+Homework = record_type('Homework', [
+    'id', 'booking_id', 'file_id', 'file_type', 'comment', 'sent_at', 'sent_by_admin_id',
+])
+
+# ДЗ вместе с датой, временем и ребёнком из записи (data.load_homeworks_for_user)
+UserHomework = record_type('UserHomework', Homework._fields + (
+    'booking_date', 'booking_time', 'child_name',
+))
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+# config.py читает окружение при импорте, поэтому оно задаётся до импорта модулей бота.
+# Тесты работают только с временными SQLite-базами, без сети и без PostgreSQL.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_TOKEN', '123456:test-token')
+os.environ.setdefault('ADMIN_ID', '1')
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'  # каждый тест получает свою базу через фикстуру db
+os.environ['DATABASE_READ_URL'] = ''
+os.environ['BOT_MODE'] = 'polling'
+
+
+@pytest.fixture
+def empty_db(tmp_path, monkeypatch):
+    """Пустая SQLite-база без схемы; пул и кэш слотов создаются заново."""
+    import data
+
+    data.close_pool()
+    monkeypatch.setattr(data, 'DATABASE_URL', f"sqlite:///{tmp_path / 'bot.db'}")
+    data._slots_cache.bump_version()
+    yield data
+    data.close_pool()
+
+
+@pytest.fixture
+def db(empty_db):
+    """База со всеми миграциями."""
+    import migrations
+
+    migrations.ensure_schema()
+    return empty_db
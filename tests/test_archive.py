@@ -0,0 +1,45 @@
+from datetime import date, timedelta
+
+TIME = '10:00-11:00'
+
+
+def _lesson(data, day, user_id=1):
+    day_str = f'{day:%d.%m.%Y}'
+    data.add_slots(day_str, [TIME])
+    _, booking = data.book_slot({'user_id': user_id, 'date': day_str, 'time': TIME,
+                                 'child_name': 'Маша', 'phone': '+70000000000'})
+    return booking
+
+
+def _count(data, table):
+    with data.db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT COUNT(*) FROM {table}')
+        return cursor.fetchone()[0]
+
+
+def test_past_lessons_move_to_archive(db):
+    db.save_user(1, 'Родитель', '+70000000000')
+    today = date.today()
+    old = [_lesson(db, today - timedelta(days=60 + i)) for i in range(5)]
+    recent = _lesson(db, today - timedelta(days=2))
+    db.save_homework(old[0].id, 'file-1', 'document', 'ДЗ', 1)
+    analytics = db.load_booking_analytics()
+
+    assert db.archive_past(before=db.archive_horizon(days=30), batch_size=2) == (5, 5)
+
+    assert _count(db, 'bookings') == _count(db, 'slots') == 1
+    assert _count(db, 'bookings_archive') == _count(db, 'slots_archive') == 5
+    assert _count(db, 'homeworks') == 0 and _count(db, 'homeworks_archive') == 1
+    hot, _ = db.load_bookings_overview_page()
+    assert [row.id for row in hot] == [recent.id]
+    archived, _ = db.load_bookings_overview_page(archived=True)
+    assert [row.id for row in archived] == [booking.id for booking in old]  # от новых к старым
+
+    # ДЗ по архивной записи по-прежнему видно клиенту, а аналитика не меняется
+    assert [homework.booking_id for homework in db.load_homeworks_for_user(1)] == [old[0].id]
+    assert db.load_booking_analytics() == analytics
+    db.rebuild_analytics_rollups()
+    assert db.load_booking_analytics() == analytics
+
+    assert db.archive_past(before=db.archive_horizon(days=30)) == (0, 0)
@@ -0,0 +1,88 @@
+import threading
+from datetime import date, datetime, timedelta
+
+LESSON_DAY = date.today() + timedelta(days=3)  # внутри горизонта записи
+BOOKING = {'date': f'{LESSON_DAY:%d.%m.%Y}', 'time': '10:00-11:00', 'child_name': 'Маша', 'phone': '+70000000000'}
+
+
+def _users(data, count):
+    for user_id in range(1, count + 1):
+        data.save_user(user_id, f'Родитель {user_id}', '+70000000000')
+
+
+def test_concurrent_booking_of_one_slot(db):
+    clients = 8
+    _users(db, clients)
+    db.add_slots(BOOKING['date'], [BOOKING['time']])
+    start = threading.Barrier(clients)
+    results = []
+
+    def book(user_id):
+        start.wait()
+        results.append(db.book_slot(dict(BOOKING, user_id=user_id)))
+
+    threads = [threading.Thread(target=book, args=(user_id,)) for user_id in range(1, clients + 1)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    statuses = sorted(status for status, _ in results)
+    assert statuses == [db.BOOKING_CREATED] + [db.BOOKING_SLOT_TAKEN] * (clients - 1)
+    (winner,) = [booking for status, booking in results if status == db.BOOKING_CREATED]
+    day_start = datetime.combine(LESSON_DAY, datetime.min.time())
+    assert db.load_active_bookings_between(day_start, day_start + timedelta(days=1)) == [winner]
+    assert BOOKING['date'] not in db.load_bookable_slots(use_cache=False)
+
+
+
+def test_concurrent_cancel_of_one_booking(db):
+    attempts = 8
+    _users(db, 2)
+    db.add_slots(BOOKING['date'], [BOOKING['time']])
+    _, booking = db.book_slot(dict(BOOKING, user_id=1))
+    start = threading.Barrier(attempts)
+    results = []
+
+    def cancel():
+        start.wait()
+        results.append(db.cancel_booking(booking.id))
+
+    threads = [threading.Thread(target=cancel) for _ in range(attempts)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [result.id for result in results if result is not None] == [booking.id]
+    assert db.load_booking_analytics()['cancelled'] == 1
+    # Повторная (запоздавшая) отмена не освобождает слот, уже занятый другим клиентом
+    status, _ = db.book_slot(dict(BOOKING, user_id=2))
+    assert status == db.BOOKING_CREATED
+    assert db.cancel_booking(booking.id) is None
+    assert BOOKING['date'] not in db.load_bookable_slots(use_cache=False)
+    assert db.load_booking_analytics()['cancelled'] == 1
+
+def test_cancel_frees_the_slot_for_the_next_client(db):
+    _users(db, 2)
+    db.add_slots(BOOKING['date'], [BOOKING['time']])
+    assert BOOKING['date'] in db.load_bookable_slots()
+    status, booking = db.book_slot(dict(BOOKING, user_id=1))
+    assert status == db.BOOKING_CREATED
+    assert BOOKING['date'] not in db.load_bookable_slots()  # кэш сброшен записью
+
+    assert db.book_slot(dict(BOOKING, user_id=2)) == (db.BOOKING_SLOT_TAKEN, None)
+    assert db.cancel_booking(booking.id).cancelled_by_user
+    assert BOOKING['date'] in db.load_bookable_slots()
+    status, _ = db.book_slot(dict(BOOKING, user_id=2))
+    assert status == db.BOOKING_CREATED
+
+
+def test_deleted_slot_cannot_be_booked(db):
+    _users(db, 1)
+    db.add_slots(BOOKING['date'], [BOOKING['time']])
+    (slot,) = db.load_slots(use_cache=False)[BOOKING['date']]
+    db.mark_slot_deleted(slot.id)
+
+    assert db.book_slot(dict(BOOKING, user_id=1)) == (db.BOOKING_SLOT_TAKEN, None)
+
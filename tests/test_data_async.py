@@ -0,0 +1,29 @@
+import asyncio
+import inspect
+
+import data_async
+
+
+def test_only_io_functions_are_wrapped():
+    for name in data_async.ASYNC_FUNCTIONS:
+        assert inspect.iscoroutinefunction(getattr(data_async, name)), name
+    assert not hasattr(data_async, 'parse_slot_datetime')
+    assert not hasattr(data_async, 'execute_prepared')
+
+
+def test_async_calls_use_data_layer(db):
+    db.save_user(1, 'Родитель', '+70000000000')
+    db.add_slots('10.03.2031', ['10:00-11:00', '11:00-12:00'])
+
+    async def scenario():
+        status, booking = await data_async.book_slot({
+            'user_id': 1, 'date': '10.03.2031', 'time': '10:00-11:00',
+            'child_name': 'Маша', 'phone': '+70000000000',
+        })
+        bookings = await data_async.load_user_bookings(1)
+        await data_async.close()
+        return status, booking, bookings
+
+    status, booking, bookings = asyncio.run(scenario())
+    assert status == db.BOOKING_CREATED
+    assert [item.id for item in bookings] == [booking.id]
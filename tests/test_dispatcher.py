@@ -0,0 +1,89 @@
+import random
+import threading
+import time
+
+import telebot
+
+from dispatcher import ChatDispatcher, DispatchingTeleBot
+
+
+def _message_update(update_id, chat_id, text):
+    return telebot.types.Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Test'},
+            'text': text,
+        },
+    })
+
+
+def test_tasks_of_one_chat_run_in_order():
+    dispatcher = ChatDispatcher(num_workers=4)
+    seen = {chat: [] for chat in range(5)}
+    for i in range(50):
+        for chat in seen:
+            def task(chat=chat, i=i):
+                time.sleep(random.random() / 1000)
+                seen[chat].append(i)
+            dispatcher.submit(chat, task)
+    dispatcher.stop()
+
+    assert all(items == list(range(50)) for items in seen.values())
+    stats = dispatcher.stats()
+    assert stats['completed'] == stats['submitted'] == 250
+    assert stats['queue_depth'] == 0
+
+
+def test_chats_run_in_parallel():
+    dispatcher = ChatDispatcher(num_workers=2)
+    release = threading.Event()
+    done = threading.Event()
+    dispatcher.submit('slow', release.wait)
+    dispatcher.submit('fast', done.set)
+
+    # Долгий обработчик одного чата не задерживает другой
+    assert done.wait(5)
+    release.set()
+    dispatcher.stop()
+
+
+def test_failed_task_does_not_block_chat():
+    dispatcher = ChatDispatcher(num_workers=1)
+    seen = []
+    dispatcher.submit(1, lambda: 1 / 0)
+    dispatcher.submit(1, lambda: seen.append('next'))
+    dispatcher.stop()
+
+    assert seen == ['next']
+    assert dispatcher.stats()['failed'] == 1
+
+
+def test_polling_handles_each_update_once(monkeypatch):
+    bot = DispatchingTeleBot('123456:test-token', num_workers=4)
+    handled = []
+    offsets = []
+    pending = [_message_update(update_id, chat_id=update_id % 2, text=str(update_id))
+               for update_id in (1, 2, 3)]
+
+    @bot.message_handler(func=lambda message: True)
+    def record(message):
+        time.sleep(0.05)  # обработка дольше, чем следующий запрос getUpdates
+        handled.append(message.text)
+
+    def get_updates(offset=None, **kwargs):
+        offsets.append(offset)
+        if len(offsets) == 2:
+            bot.stop_polling()
+        # Как Telegram: возвращаются обновления, ещё не подтверждённые смещением
+        return [update for update in pending if update.update_id >= offset]
+
+    monkeypatch.setattr(bot, 'get_updates', get_updates)
+    monkeypatch.setattr(bot, 'get_me', lambda: telebot.types.User(1, True, 'bot', username='test_bot'))
+    bot.polling(interval=0, timeout=0, long_polling_timeout=0)
+    bot.dispatcher.stop()
+
+    assert offsets == [1, 4]
+    assert sorted(handled) == ['1', '2', '3']
@@ -0,0 +1,93 @@
+import pytest
+
+import db_backends
+import migrations
+
+
+def _tables(data):
+    with data.db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        return {row[0] for row in cursor.fetchall()}
+
+
+def test_fresh_database_gets_every_migration(empty_db):
+    assert migrations.current_version() == 0
+
+    migrations.ensure_schema()
+
+    assert migrations.current_version() == migrations.LATEST_VERSION
+    assert migrations.pending_migrations() == []
+    assert {'users', 'slots', 'bookings', 'homeworks', 'schema_version',
+            'slots_archive', 'bookings_archive', 'homeworks_archive'} <= _tables(empty_db)
+
+
+def test_up_to_date_schema_is_not_migrated_again(db, monkeypatch):
+    def fail():
+        raise AssertionError("миграции не должны запускаться")
+
+    monkeypatch.setattr(migrations, 'apply_migrations', fail)
+    migrations.ensure_schema()
+    assert migrations.current_version() == migrations.LATEST_VERSION
+
+
+def test_only_missing_migrations_are_applied(empty_db, monkeypatch):
+    monkeypatch.setattr(migrations, 'MIGRATIONS', migrations.MIGRATIONS[:4])
+    assert migrations.apply_migrations() == [1, 2, 3, 4]
+    monkeypatch.undo()
+
+    assert migrations.apply_migrations() == list(range(5, migrations.LATEST_VERSION + 1))
+    assert migrations.apply_migrations() == []
+
+
+def test_duplicate_active_bookings_stop_the_migration(empty_db, monkeypatch):
+    monkeypatch.setattr(migrations, 'MIGRATIONS', migrations.MIGRATIONS[:4])
+    migrations.apply_migrations()
+    monkeypatch.undo()
+    empty_db.save_user(1, 'Родитель', '+70000000000')
+    booking = {'user_id': 1, 'date': '10.03.2031', 'time': '10:00-11:00',
+               'child_name': 'Маша', 'phone': '+70000000000'}
+    empty_db.save_booking(booking)
+    empty_db.save_booking(booking)
+
+    with pytest.raises(migrations.MigrationError):
+        migrations.apply_migrations()
+    assert migrations.current_version() == 4
+
+
+def test_migrations_fit_in_a_single_connection_pool(empty_db, monkeypatch):
+    monkeypatch.setattr(empty_db.config, 'DB_POOL_MAX_SIZE', 1)
+    monkeypatch.setattr(empty_db.config, 'DB_POOL_TIMEOUT', 2)
+
+    migrations.ensure_schema()
+
+    assert empty_db.get_pool_stats()['timeouts'] == 0
+    assert migrations.current_version() == migrations.LATEST_VERSION
+
+
+def test_postgres_migration_lock_does_not_use_the_pool(monkeypatch):
+    executed = []
+
+    class FakeConnection:
+        autocommit = False
+        closed = False
+
+        def cursor(self):
+            return self
+
+        def execute(self, query, params=None):
+            executed.append(query.split('(')[0])
+
+        def close(self):
+            self.closed = True
+
+    connection = FakeConnection()
+    monkeypatch.setattr(db_backends.psycopg2, 'connect', lambda dsn: connection)
+    backend = db_backends.PostgresBackend('postgresql://localhost/bot', min_size=0, max_size=1)
+
+    with backend.migration_lock():
+        assert backend.stats()['checkouts'] == 0
+        assert executed == ['SELECT pg_advisory_lock']
+
+    assert executed == ['SELECT pg_advisory_lock', 'SELECT pg_advisory_unlock']
+    assert connection.autocommit and connection.closed
@@ -0,0 +1,99 @@
+import sqlite3
+import time
+from datetime import date, timedelta
+
+import pytest
+
+TIMES = ['10:00-11:00', '11:00-12:00', '12:00-13:00']
+
+
+def _pages(load, **kwargs):
+    items, cursor, pages = [], None, 0
+    while True:
+        page, cursor = load(cursor=cursor, **kwargs)
+        items += page
+        pages += 1
+        if cursor is None:
+            return items, pages
+
+
+def _add_days(data, first_day, days):
+    for offset in range(days):
+        data.add_slots(f'{first_day + timedelta(days=offset):%d.%m.%Y}', TIMES)
+
+
+def test_slot_pages_cover_every_row_once(db):
+    _add_days(db, date(2031, 3, 10), 5)
+
+    slots, pages = _pages(db.load_slots_page, page_size=4)
+
+    assert pages == 4
+    assert len(slots) == 15
+    assert len({slot.id for slot in slots}) == 15
+    assert [slot.starts_at for slot in slots] == sorted(slot.starts_at for slot in slots)
+
+
+def test_slot_pages_apply_filters(db):
+    _add_days(db, date(2031, 3, 10), 5)
+    (slot, *_) = db.load_slots(use_cache=False)['11.03.2031']
+    db.mark_slot_deleted(slot.id)
+
+    active, _ = _pages(db.load_slots_page, page_size=2, status='active',
+                       from_date=date(2031, 3, 11), to_date=date(2031, 3, 13))
+
+    assert len(active) == 5
+    assert slot.id not in {item.id for item in active}
+    assert {item.date for item in active} == {'11.03.2031', '12.03.2031'}
+
+
+def test_rows_with_the_same_start_are_not_skipped(db):
+    db.save_user(1, 'Родитель', '+70000000000')
+    db.add_slots('10.03.2031', TIMES[:1])
+    booking = {'user_id': 1, 'date': '10.03.2031', 'time': TIMES[0],
+               'child_name': 'Маша', 'phone': '+70000000000'}
+    for _ in range(4):
+        db.save_booking(dict(booking, cancelled_by_user=True))
+    db.save_booking(booking)
+
+    rows, pages = _pages(db.load_bookings_overview_page, page_size=2)
+
+    assert pages == 3
+    assert [row.id for row in rows] == sorted(row.id for row in rows)
+    assert len(set(row.id for row in rows)) == 5
+
+
+def test_homework_pages_go_from_newest(db):
+    db.save_user(1, 'Родитель', '+70000000000')
+    first_day = date.today() - timedelta(days=10)
+    _add_days(db, first_day, 3)
+    for offset in range(3):
+        db.book_slot({'user_id': 1, 'date': f'{first_day + timedelta(days=offset):%d.%m.%Y}',
+                      'time': TIMES[0], 'child_name': 'Маша', 'phone': '+70000000000'})
+
+    bookings, _ = _pages(db.load_past_bookings_for_homework_page, page_size=2)
+
+    assert [booking.starts_at for booking in bookings] == sorted(
+        (booking.starts_at for booking in bookings), reverse=True)
+    assert len(bookings) == 3
+
+
+@pytest.mark.parametrize('cursor', ['not a cursor', '!!!', 'MjAzMQ'])
+def test_broken_cursor_is_rejected(db, cursor):
+    with pytest.raises(ValueError):
+        db.load_slots_page(cursor=cursor)
+
+
+def test_pages_can_bypass_a_lagging_replica(db, tmp_path, monkeypatch):
+    # «Реплика» — пустая база без схемы: любое чтение с неё заканчивается ошибкой
+    monkeypatch.setattr(db.config, 'DATABASE_READ_URL', f"sqlite:///{tmp_path / 'replica.db'}")
+    db.add_slots('10.03.2031', TIMES)
+    db._start_replica_monitor()
+    for _ in range(100):
+        if db.get_replica_stats().get('usable'):
+            break
+        time.sleep(0.01)
+
+    slots, _ = db.load_slots_page(replica=False)
+    assert len(slots) == 3
+    with pytest.raises(sqlite3.OperationalError):
+        db.load_slots_page()
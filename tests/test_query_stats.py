@@ -0,0 +1,28 @@
+import threading
+
+from query_stats import QueryStats
+
+
+def test_generator_consumed_from_several_threads():
+    stats = QueryStats()
+
+    @stats.timed
+    def rows():
+        for i in range(4):
+            stats.add_wait(0.001)
+            yield i
+
+    iterator = rows()
+    seen = [next(iterator)]
+    # Следующие строки берутся в других потоках
+    for _ in range(3):
+        thread = threading.Thread(target=lambda: seen.append(next(iterator)))
+        thread.start()
+        thread.join()
+    assert list(iterator) == []
+
+    assert seen == [0, 1, 2, 3]
+    assert stats._stack() == []
+    entry = stats.snapshot()[0]
+    assert (entry['name'], entry['calls'], entry['rows']) == ('rows', 1, 4)
+    assert entry['wait_ms'] > 3
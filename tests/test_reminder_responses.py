@@ -0,0 +1,65 @@
+from datetime import date, timedelta
+
+import db_backends
+
+TIME = '10:00-11:00'
+
+
+def _bookings(data, count):
+    first_day = date.today() + timedelta(days=1)
+    bookings = []
+    for i in range(count):
+        user_id = i + 1
+        day = f'{first_day + timedelta(days=i):%d.%m.%Y}'
+        data.save_user(user_id, f'Родитель {user_id}', '+70000000000')
+        data.add_slots(day, [TIME])
+        _, booking = data.book_slot({'user_id': user_id, 'date': day, 'time': TIME,
+                                     'child_name': f'Ребёнок {user_id}', 'phone': '+70000000000'})
+        bookings.append(booking)
+    return bookings
+
+
+def _count_statements(monkeypatch):
+    calls = []
+    for method in ('execute', 'executemany'):
+        original = getattr(db_backends.SQLiteCursor, method)
+
+        def counted(self, *args, original=original, **kwargs):
+            calls.append(args[0])
+            return original(self, *args, **kwargs)
+        monkeypatch.setattr(db_backends.SQLiteCursor, method, counted)
+    return calls
+
+
+def test_batch_is_written_with_a_fixed_number_of_statements(db, monkeypatch):
+    bookings = _bookings(db, 20)
+    responses = [[b.user_id, b.date, b.time, db.REMINDER_CANCEL if i % 2 else db.REMINDER_CONFIRM]
+                 for i, b in enumerate(bookings)]
+    calls = _count_statements(monkeypatch)
+
+    assert db.apply_reminder_responses(responses) == (10, 10)
+
+    # SELECT, два UPDATE записей, освобождение слотов и три сводные таблицы
+    assert len(calls) == 7
+    monkeypatch.undo()
+    free_days = set(db.load_bookable_slots(use_cache=False))
+    assert free_days == {b.date for i, b in enumerate(bookings) if i % 2}
+    analytics = db.load_booking_analytics()
+    assert (analytics['confirmed'], analytics['cancelled']) == (10, 10)
+    db.rebuild_analytics_rollups()
+    assert db.load_booking_analytics() == analytics
+
+
+def test_last_response_wins_and_cancelled_bookings_are_skipped(db):
+    first, second = _bookings(db, 2)
+    db.cancel_booking(second.id)
+
+    confirmed, cancelled = db.apply_reminder_responses([
+        [first.user_id, first.date, first.time, db.REMINDER_CANCEL],
+        [first.user_id, first.date, first.time, db.REMINDER_CONFIRM],
+        [second.user_id, second.date, second.time, db.REMINDER_CONFIRM],
+    ])
+
+    assert (confirmed, cancelled) == (1, 0)
+    assert db.get_booking(first.id).confirmed
+    assert not db.get_booking(second.id).confirmed
@@ -0,0 +1,75 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+import webhook
+
+PATH = '/telegram/webhook'
+SECRET = 'test-secret'
+UPDATE = json.dumps({
+    'update_id': 1,
+    'message': {
+        'message_id': 1, 'date': 0, 'text': 'привет',
+        'chat': {'id': 42, 'type': 'private'},
+        'from': {'id': 42, 'is_bot': False, 'first_name': 'Test'},
+    },
+}).encode()
+
+
+class RecordingBot:
+    def __init__(self):
+        self.updates = []
+        self.received = threading.Event()
+
+    def process_new_updates(self, updates):
+        self.updates += updates
+        self.received.set()
+
+
+@pytest.fixture
+def server():
+    bot = RecordingBot()
+    server = webhook.create_server(bot, '127.0.0.1', 0, PATH, SECRET)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server, bot
+    server.shutdown()
+    server.server_close()
+
+
+def _post(server, body=UPDATE, path=PATH, secret=SECRET, lengths=None):
+    conn = http.client.HTTPConnection(*server.server_address, timeout=5)
+    conn.putrequest('POST', path)
+    for length in (lengths if lengths is not None else [str(len(body))]):
+        conn.putheader('Content-Length', length)
+    if secret is not None:
+        conn.putheader(webhook.SECRET_HEADER, secret)
+    conn.endheaders()
+    conn.send(body)
+    status = conn.getresponse().status
+    conn.close()
+    return status
+
+
+def test_update_is_passed_to_the_bot(server):
+    server, bot = server
+    assert _post(server) == 200
+    assert bot.received.wait(5)
+    assert [update.message.text for update in bot.updates] == ['привет']
+
+
+@pytest.mark.parametrize('kwargs, status', [
+    ({'secret': 'wrong'}, 403),
+    ({'secret': None}, 403),
+    ({'path': '/other'}, 404),
+    ({'lengths': ['abc']}, 400),
+    ({'lengths': [str(len(UPDATE))] * 2}, 400),
+    ({'lengths': []}, 400),
+    ({'body': b'not json'}, 400),
+])
+def test_bad_requests_are_rejected(server, kwargs, status):
+    server, bot = server
+    assert _post(server, **kwargs) == status
+    assert bot.updates == []
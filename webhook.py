@@ -0,0 +1,83 @@
+import hmac
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import telebot
+
+# Приём обновлений Telegram через webhook.
+#
+# Встроенный HTTP-сервер принимает POST от Telegram на WEBHOOK_PATH, сверяет секрет из
+# заголовка X-Telegram-Bot-Api-Secret-Token, сразу отвечает 200 и передаёт обновление
+# боту: обработчики выполняются в пуле потоков бота, а не в потоке HTTP-запроса.
+# Для локальной проверки записанные обновления можно отправить командой
+# python manage.py post-updates updates.json
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+MAX_BODY_SIZE = 1024 * 1024  # обновления Telegram намного меньше
+
+
+def create_server(bot, host, port, path, secret_token):
+    """HTTP-сервер, передающий обновления с path в bot.process_new_updates."""
+    expected_secret = secret_token.encode()
+
+    class UpdateHandler(BaseHTTPRequestHandler):
+        def _reply(self, status):
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def do_POST(self):
+            if self.path != path:
+                self._reply(404)
+                return
+            if not hmac.compare_digest(self.headers.get(SECRET_HEADER, '').encode(), expected_secret):
+                print(f"Webhook: запрос с неверным секретом от {self.client_address[0]}")
+                self._reply(403)
+                return
+            lengths = self.headers.get_all('Content-Length') or []
+            try:
+                if len(lengths) != 1:
+                    raise ValueError(f"ожидается один заголовок Content-Length, получено {len(lengths)}")
+                length = int(lengths[0])
+            except ValueError as e:
+                print(f"Webhook: некорректный Content-Length: {e}")
+                self._reply(400)
+                return
+            if length <= 0 or length > MAX_BODY_SIZE:
+                self._reply(413 if length > MAX_BODY_SIZE else 400)
+                return
+            try:
+                update = telebot.types.Update.de_json(self.rfile.read(length).decode('utf-8'))
+            except Exception as e:
+                print(f"Webhook: некорректное обновление: {e}")
+                self._reply(400)
+                return
+
+            # Отвечаем до обработки: Telegram не ждёт обработчиков и не повторяет обновление
+            self._reply(200)
+            bot.process_new_updates([update])
+
+        def do_GET(self):
+            self._reply(405)
+
+        def log_message(self, format, *args):
+            pass  # не пишем в лог каждое обновление
+
+    return ThreadingHTTPServer((host, port), UpdateHandler)
+
+
+def run(bot, url, path, secret_token, host, port):
+    """Регистрирует webhook в Telegram и принимает обновления до остановки процесса.
+
+    При остановке webhook удаляется, чтобы бота можно было снова запустить в режиме polling.
+    """
+    server = create_server(bot, host, port, path, secret_token)
+    bot.set_webhook(url=url.rstrip('/') + path, secret_token=secret_token)
+    print(f"Webhook: {url.rstrip('/')}{path}, локальный сервер {host}:{port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        try:
+            bot.delete_webhook()
+        except Exception as e:
+            print(f"Не удалось удалить webhook: {e}")
@@ -0,0 +1,108 @@
+import json
+import os
+import threading
+
+
+class WriteBehindQueue:
+    """Очередь отложенной записи: изменения копятся в памяти и пишутся в БД пачками.
+
+    put() только кладёт элемент в очередь и сразу возвращается. Фоновый поток вызывает
+    flush_func(список элементов) раз в interval секунд или сразу, как только набралось
+    max_batch элементов. Элементы с одинаковым ключом схлопываются (остаётся последний).
+    Если запись не удалась, элементы возвращаются в очередь и повторяются в следующий раз.
+    При остановке (close) всё оставшееся записывается в БД, а если БД недоступна —
+    в журнал journal_path (строки JSON), который replay_journal() применяет при запуске.
+    """
+
+    def __init__(self, name, flush_func, interval=1.0, max_batch=200, journal_path=None):
+        self.name = name
+        self.flush_func = flush_func
+        self.interval = interval
+        self.max_batch = max_batch
+        self.journal_path = journal_path
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # пачки пишутся строго по очереди
+        self._pending = {}  # ключ -> элемент (dict сохраняет порядок поступления)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._stats = {'queued': 0, 'flushed': 0, 'batches': 0, 'failures': 0, 'journaled': 0}
+
+    def put(self, key, item):
+        """Ставит элемент в очередь; при достижении max_batch будит поток записи."""
+        with self._lock:
+            self._pending[key] = item
+            self._stats['queued'] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f'{self.name}-writer', daemon=True)
+                self._thread.start()
+            if len(self._pending) >= self.max_batch:
+                self._wakeup.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Записывает всё накопленное пачками по max_batch. Возвращает True, если очередь пуста."""
+        with self._flush_lock:
+            with self._lock:
+                items = list(self._pending.items())
+                self._pending = {}
+
+            for start in range(0, len(items), self.max_batch):
+                batch = items[start:start + self.max_batch]
+                try:
+                    self.flush_func([item for _, item in batch])
+                except Exception as e:
+                    print(f"Ошибка записи очереди {self.name} ({len(items) - start} шт. ждут повтора): {e}")
+                    with self._lock:
+                        # Более новые элементы с тем же ключом, пришедшие во время записи, важнее
+                        for key, item in items[start:]:
+                            self._pending.setdefault(key, item)
+                        self._stats['failures'] += 1
+                    return False
+                with self._lock:
+                    self._stats['flushed'] += len(batch)
+                    self._stats['batches'] += 1
+            return True
+
+    def close(self):
+        """Останавливает поток записи и сохраняет остаток очереди (в БД или в журнал)."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self.flush():
+            return
+        with self._lock:
+            items = list(self._pending.values())
+            self._pending = {}
+        if not self.journal_path:
+            print(f"Очередь {self.name}: потеряно {len(items)} шт. (журнал не задан)")
+            return
+        with open(self.journal_path, 'a', encoding='utf-8') as journal:
+            for item in items:
+                journal.write(json.dumps(item, ensure_ascii=False) + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+        self._stats['journaled'] += len(items)
+        print(f"Очередь {self.name}: {len(items)} шт. сохранены в {self.journal_path}")
+
+    def replay_journal(self):
+        """Применяет элементы, сохранённые в журнал при прошлой остановке, и удаляет журнал."""
+        if not self.journal_path or not os.path.exists(self.journal_path):
+            return 0
+        with open(self.journal_path, encoding='utf-8') as journal:
+            items = [json.loads(line) for line in journal if line.strip()]
+        for start in range(0, len(items), self.max_batch):
+            self.flush_func(items[start:start + self.max_batch])
+        os.remove(self.journal_path)
+        print(f"Очередь {self.name}: из журнала применено {len(items)} шт.")
+        return len(items)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, pending=len(self._pending))